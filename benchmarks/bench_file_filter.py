@@ -0,0 +1,90 @@
+"""
+Benchmark of the archive file filter used by the scraper, comparing it with the previous implementation that made a
+separate pass over the urls for each filter. Both implementations are run on the same synthetic archive listing and the
+results are checked to be identical.
+
+Run from the project root with "python -m benchmarks.bench_file_filter".
+"""
+import argparse
+import random
+import time
+
+from sensor_community_data.file_filter import FileFilter
+
+sensor_types = ["sds011", "bme280", "dht22", "pms5003", "sps30"]
+
+
+# Return the urls of a synthetic archive listing for a single day, including index links and indoor sensors.
+def create_listing(date, files, seed=0):
+    rng = random.Random(seed)
+    date_url = f"https://archive.sensor.community/{date}"
+
+    file_urls = [f"{date_url}/?C=N;O=D", f"{date_url}/../"]
+    for _ in range(files):
+        indoor = "_indoor" if rng.random() < 0.05 else ""
+        file_name = f"{date}_{rng.choice(sensor_types)}_sensor_{rng.randint(1, 80000)}{indoor}.csv"
+        file_urls.append(f"{date_url}/{file_name}")
+
+    return file_urls
+
+
+# The previous implementation of the filter, kept as the reference the current implementation is compared against.
+def reference_filter(file_urls, sensor_type, sensor_ids, location_sensor_ids, remove_indoor):
+    file_urls = list(filter(lambda file_url: file_url.endswith(".csv"), file_urls))
+
+    if location_sensor_ids is not None:
+        file_urls = list(filter(lambda file_url: file_url.split("_")[3].replace(".csv", "") in location_sensor_ids,
+                                file_urls))
+
+    if sensor_type:
+        file_urls = list(filter(lambda file_url: sensor_type in file_url, file_urls))
+
+    if sensor_ids:
+        file_urls = list(filter(lambda file_url: any(sensor_id == int(file_url.split("_")[3].replace(".csv", ""))
+                                                     for sensor_id in sensor_ids), file_urls))
+
+    if remove_indoor:
+        file_urls = list(filter(lambda file_url: "indoor" not in file_url, file_urls))
+
+    return file_urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper file filter.")
+    parser.add_argument("--files", type=int, default=20000, help="Files in the listing of each day.")
+    parser.add_argument("--days", type=int, default=5, help="Days in the listing.")
+    parser.add_argument("--sensor-ids", type=int, default=2000, help="Length of the sensor id list.")
+    parser.add_argument("--location-sensors", type=int, default=5000, help="Sensors in the location.")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    listings = [create_listing(f"2020-01-{day + 1:02d}", args.files, day) for day in range(args.days)]
+    sensor_ids = rng.sample(range(1, 80000), args.sensor_ids)
+    location_sensor_ids = [str(sensor_id) for sensor_id in rng.sample(range(1, 80000), args.location_sensors)]
+
+    cases = {
+        "sensor type": dict(sensor_type="sds011", sensor_ids=None, location_sensor_ids=None),
+        "sensor type and location": dict(sensor_type="sds011", sensor_ids=None,
+                                         location_sensor_ids=location_sensor_ids),
+        "sensor type and sensor ids": dict(sensor_type="sds011", sensor_ids=sensor_ids, location_sensor_ids=None),
+    }
+
+    for name, case in cases.items():
+        start = time.perf_counter()
+        reference_urls = [reference_filter(file_urls, remove_indoor=True, **case) for file_urls in listings]
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        file_filter = FileFilter(case["sensor_type"], case["sensor_ids"], remove_indoor=True,
+                                 location_sensor_ids=case["location_sensor_ids"])
+        filtered_urls = [file_filter.filter(file_urls) for file_urls in listings]
+        filter_time = time.perf_counter() - start
+
+        assert filtered_urls == reference_urls
+
+        print(f"{name}: {args.days} x {args.files} files, reference {reference_time:.3f}s, "
+              f"filter {filter_time:.3f}s, speedup {reference_time / filter_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark of the listing of the archive, comparing the href extraction used by the scraper with parsing the index
+pages with BeautifulSoup, and measuring the time to list a range of days from the listing cache. The hrefs extracted
+from each page are checked to be identical to the hrefs found by BeautifulSoup.
+
+Saved index pages of the archive can be given with "--pages", and otherwise synthetic index pages in the formats of
+common web servers are used.
+
+Run from the project root with "python -m benchmarks.bench_listing".
+"""
+import argparse
+import html
+import random
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+from bs4 import BeautifulSoup
+
+from sensor_community_data.listing import ListingCache, extract_hrefs
+
+sensor_types = ["sds011", "bme280", "dht22", "pms5003", "sps30"]
+
+
+# Return the file names of a synthetic day in the archive.
+def create_file_names(date, files, seed=0):
+    rng = random.Random(seed)
+
+    file_names = []
+    for _ in range(files):
+        indoor = "_indoor" if rng.random() < 0.05 else ""
+        file_names.append(f"{date}_{rng.choice(sensor_types)}_sensor_{rng.randint(1, 80000)}{indoor}.csv")
+
+    return sorted(set(file_names))
+
+
+# Return an index page in the format used by nginx, which serves the archive.
+def create_nginx_page(date, file_names):
+    rows = "\n".join(f'<a href="{file_name}">{file_name}</a>{" " * 10}02-Jan-2020 00:12{" " * 10}123456'
+                     for file_name in file_names)
+
+    return (f"<html>\r\n<head><title>Index of /{date}/</title></head>\r\n<body>\r\n<h1>Index of /{date}/</h1><hr>"
+            f'<pre><a href="../">../</a>\n{rows}\n</pre><hr></body>\r\n</html>\r\n')
+
+
+# Return an index page in the format used by Apache, including the links used to sort the listing.
+def create_apache_page(date, file_names):
+    sort_links = "".join(f'<th><a href="?C={column};O=A">{name}</a></th>'
+                         for column, name in [("N", "Name"), ("M", "Last modified"), ("S", "Size")])
+    rows = "\n".join(f'<tr><td valign="top"><img src="/icons/text.gif" alt="[TXT]"></td>'
+                     f'<td><a href="{file_name}">{file_name}</a></td><td align="right">2020-01-02 00:12  </td>'
+                     f'<td align="right">120K</td></tr>' for file_name in file_names)
+
+    return (f'<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 3.2 Final//EN">\n<html>\n<head>\n<title>Index of /{date}</title>'
+            f"\n</head>\n<body>\n<h1>Index of /{date}</h1>\n<table>\n<tr>{sort_links}</tr>\n"
+            f'<!-- <a href="hidden.csv"> -->\n<tr><td><a href="/">Parent Directory</a></td></tr>\n{rows}\n'
+            f"</table>\n</body></html>\n")
+
+
+# Return an index page in the format used by the local archive server, which escapes the links.
+def create_python_page(date, file_names):
+    rows = "\n".join(f'<li><a href="{quote(file_name, errors="surrogatepass")}">{html.escape(file_name)}</a></li>'
+                     for file_name in file_names)
+
+    return (f'<!DOCTYPE HTML>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n<title>Directory listing for /{date}/'
+            f"</title>\n</head>\n<body>\n<h1>Directory listing for /{date}/</h1>\n<hr>\n<ul>\n{rows}\n</ul>\n<hr>\n"
+            f"</body>\n</html>\n")
+
+
+def reference_hrefs(page):
+    soup = BeautifulSoup(page, features="html.parser")
+    return [a["href"] for a in soup.find_all("a", href=True)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the listing of the archive.")
+    parser.add_argument("--pages", help="Folder with saved index pages of the archive.")
+    parser.add_argument("--files", type=int, default=20000, help="Files in each synthetic index page.")
+    parser.add_argument("--days", type=int, default=3 * 365, help="Days listed from the listing cache.")
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = {path.name: path.read_text() for path in sorted(Path(args.pages).iterdir()) if path.is_file()}
+    else:
+        file_names = create_file_names("2020-01-01", args.files)
+        pages = {"nginx": create_nginx_page("2020-01-01", file_names),
+                 "apache": create_apache_page("2020-01-01", file_names),
+                 "archive server": create_python_page("2020-01-01", file_names)}
+
+    for name, page in pages.items():
+        start = time.perf_counter()
+        expected_hrefs = reference_hrefs(page)
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hrefs = extract_hrefs(page)
+        extract_time = time.perf_counter() - start
+
+        assert hrefs == expected_hrefs, f"The hrefs extracted from {name} differ from BeautifulSoup"
+
+        print(f"{name}: {len(hrefs)} hrefs, BeautifulSoup {reference_time:.3f}s, extract {extract_time:.3f}s, "
+              f"speedup {reference_time / extract_time:.1f}x")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        listing_cache = ListingCache(Path(tmpdir).joinpath("listing_cache.sqlite"))
+        hrefs = extract_hrefs(next(iter(pages.values())))
+        date_urls = [f"https://archive.sensor.community/day-{day}" for day in range(args.days)]
+
+        for date_url in date_urls:
+            listing_cache.set(date_url, hrefs)
+
+        start = time.perf_counter()
+        listings = [listing_cache.get(date_url) for date_url in date_urls]
+        cache_time = time.perf_counter() - start
+        listing_cache.close()
+
+        assert all(listing == hrefs for listing in listings)
+
+        size = Path(tmpdir).joinpath("listing_cache.sqlite").stat().st_size / 2 ** 20
+        print(f"listing cache: {args.days} days of {len(hrefs)} hrefs in {cache_time:.3f}s, "
+              f"{cache_time / args.days * 1000:.2f}ms per day, {size:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark of a scrape piped into the preprocessor, run on a synthetic archive served by a local archive server. The
+scraper and preprocessor are run as they are used, combining the cleaned data from each city and resampling it, and
+the stages are timed by the spans they record: listing, downloading, parsing, geocoding, cleaning, combining,
+resampling and writing. The time of each stage, the throughput of the run and the peak memory are reported, and can be
+written to a JSON file to track performance between changes.
+
+The stages of different files and locations run concurrently, so the time of a stage is the busy time summed over all
+threads and the stage times can add up to more than the wall time of the run.
+
+Run from the project root with "python -m benchmarks.bench_pipeline".
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_archive import create_archive
+from sensor_community_data.archive_server import ArchiveServer
+from sensor_community_data.preprocessor import Preprocessor
+from sensor_community_data.scraper import Scraper
+
+# The stages in the order they are reported, as named by the spans of the scraper and preprocessor.
+stages = ["listing", "download", "parse", "geocode", "clean", "combine", "resample", "write"]
+
+
+# Writing a gazetteer with the given number of cities spread over the area of the synthetic sensors, so the sensors
+# are geocoded offline.
+def create_gazetteer(path, cities):
+    pd.DataFrame({
+        "city": [f"City{i}" for i in range(cities)],
+        "country": "Country",
+        "lat": np.linspace(47, 55, cities),
+        "lng": np.linspace(6, 15, cities)
+    }).to_csv(path, index=False)
+
+
+# Return the highest resident memory of the process so far in megabytes.
+def get_peak_rss_mb():
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # The resident memory is given in bytes on macOS and in kilobytes elsewhere.
+    return max_rss / 2 ** 20 if platform.system() == "Darwin" else max_rss / 2 ** 10
+
+
+def format_number(number):
+    return "-" if number is None else f"{number:.1f}"
+
+
+def print_report(results):
+    print(f"{'stage':<12}{'calls':>10}{'seconds':>10}")
+    for name, span in results["stages"].items():
+        print(f"{name:<12}{span['calls']:>10}{span['seconds']:>10.3f}")
+
+    print(f"\nwall time {results['seconds']:.3f}s, {results['rows']} rows in {results['files']} files, "
+          f"{format_number(results['rows_per_second'])} rows/s, {format_number(results['files_per_second'])} files/s")
+    print(f"peak RSS {results['peak_rss_mb']:.1f} MB, peak traced {format_number(results['peak_traced_mb'])} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a scrape piped into the preprocessor on a synthetic "
+                                                 "archive.")
+    parser.add_argument("--days", type=int, default=3, help="Days in the synthetic archive.")
+    parser.add_argument("--sensors", type=int, default=100, help="Sensors per day.")
+    parser.add_argument("--rows", type=int, default=2000, help="Rows per sensor file.")
+    parser.add_argument("--cities", type=int, default=5, help="Cities the sensors are geocoded to.")
+    parser.add_argument("--resample-freq", default="10T", help="The resampling frequency.")
+    parser.add_argument("--max-connections", type=int, default=16, help="Concurrent requests to the archive.")
+    parser.add_argument("--storage-format", default="csv", help="The format the results are written in.")
+    parser.add_argument("--chunksize", type=int, help="Rows parsed at a time when reading a file.")
+    parser.add_argument("--archive", help="Folder with an existing archive to use instead of a generated archive.")
+    parser.add_argument("--trace-memory", action="store_true", help="Trace the peak memory allocated in the run, "
+                                                                    "which slows down the run.")
+    parser.add_argument("--output", help="JSON file the results are written to.")
+    args = parser.parse_args()
+
+    archive_path = Path(args.archive).resolve() if args.archive else None
+    output_path = Path(args.output).resolve() if args.output else None
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Running in the temporary folder, so the caches of the project are not used or changed.
+        os.chdir(tmpdir)
+        create_gazetteer("gazetteer.csv", args.cities)
+
+        if not archive_path:
+            archive_path = Path(tmpdir, "archive")
+            files, rows = create_archive(archive_path, args.days, args.sensors, args.rows)
+            print(f"Generated {args.days} days with {files} files and {rows} rows")
+
+        with ArchiveServer(archive_path) as server:
+            day_paths = sorted(path.name for path in archive_path.iterdir() if path.is_dir())
+            preprocessor = Preprocessor("output", combine_city_data=True, resample_freq=args.resample_freq,
+                                        clean_data=True, storage_format=args.storage_format,
+                                        gazetteer_path="gazetteer.csv")
+            scraper = Scraper(["P1", "P2"], "sds011", start_date=date.fromisoformat(day_paths[0]),
+                              end_date=date.fromisoformat(day_paths[-1]), preprocessor=preprocessor,
+                              archive_url=server.url, max_connections=args.max_connections, listing_cache_path=None,
+                              chunksize=args.chunksize)
+
+            if args.trace_memory:
+                tracemalloc.start()
+
+            start = time.perf_counter()
+            scraper.start()
+            seconds = time.perf_counter() - start
+
+            peak_traced_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20 if args.trace_memory else None
+            tracemalloc.stop()
+
+    summary = scraper.metrics.summary()
+    rows, files = summary["counters"].get("rows", 0), summary["counters"].get("files", 0)
+    results = {
+        "seconds": seconds,
+        "rows": rows,
+        "files": files,
+        "rows_per_second": rows / seconds if rows else None,
+        "files_per_second": files / seconds if files else None,
+        "peak_traced_mb": peak_traced_mb,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "stages": {name: summary["spans"][name] for name in stages if name in summary["spans"]},
+        "counters": summary["counters"]
+    }
+
+    print_report(results)
+
+    if output_path:
+        with open(output_path, "w") as outputfile:
+            json.dump({"settings": vars(args), **results}, outputfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
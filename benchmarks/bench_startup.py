@@ -0,0 +1,71 @@
+"""
+Benchmark of the startup time of the command line interface and of the modules and objects it loads. Each command is
+run in a fresh interpreter a number of times and the minimum and median wall time are reported, with the time of an
+empty interpreter as the baseline. The commands run in a temporary folder, so no caches or data in the project are
+used or changed.
+
+Run from the project root with "python -m benchmarks.bench_startup".
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# The commands that are timed, as arguments to the interpreter.
+commands = {
+    "interpreter": ["-c", "pass"],
+    "import cli": ["-c", "import sensor_community_data.cli"],
+    "cli --help": ["-m", "sensor_community_data", "--help"],
+    "cli status": ["-m", "sensor_community_data", "status"],
+    "import scraper": ["-c", "import sensor_community_data.scraper"],
+    "import preprocessor": ["-c", "import sensor_community_data.preprocessor"],
+    "create preprocessor": ["-c", "from sensor_community_data.preprocessor import Preprocessor; "
+                                  "Preprocessor('output', combine_city_data=True, add_lockdown_info=True)"],
+    "create scraper": ["-c", "from sensor_community_data.preprocessor import Preprocessor; "
+                             "from sensor_community_data.scraper import Scraper; "
+                             "Scraper(['P1', 'P2'], 'sds011', preprocessor=Preprocessor('output'))"]
+}
+
+
+# Return the wall time of each run of the command in seconds.
+def time_command(arguments, repeat, cwd, env):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + arguments, cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of the command line interface.")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs of each command.")
+    parser.add_argument("--output", help="JSON file the results are written to.")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])))
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "profiles.json").write_text(json.dumps({"default": {"preprocessor": {"save_path": "output"}}}))
+
+        print(f"{'command':<22}{'min ms':>10}{'median ms':>12}")
+        for name, arguments in commands.items():
+            times = time_command(arguments, args.repeat, tmpdir, env)
+            results[name] = {"min_seconds": min(times), "median_seconds": statistics.median(times)}
+
+            print(f"{name:<22}{min(times) * 1000:>10.1f}{statistics.median(times) * 1000:>12.1f}")
+
+    if args.output:
+        with open(args.output, "w") as outputfile:
+            json.dump({"settings": vars(args), "commands": results}, outputfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
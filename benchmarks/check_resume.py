@@ -0,0 +1,153 @@
+"""
+Check that the combined and resampled city data is the same however it is produced: preprocessed from the scraped data
+folder in one go, piped from the scraper in a single run, piped in a run that is interrupted before it finishes and
+then resumed, and piped in consecutive incremental runs. The check runs on a synthetic archive served by a local
+archive server, and on a second sparse archive where most resampling buckets are empty and have to be filled, and exits
+with a non-zero status if any output differs from the output of the single piped run.
+
+The rows and timestamps have to be identical, while the values may differ by one unit in the last rounded decimal, as
+the sensors are merged in download order when piped and in file name order otherwise, which changes the order rows
+with the same timestamp are summed in. Every run is incremental, so a last bucket that continues into the day after
+the last day is kept for a later run in all of them.
+
+Run from the project root with "python -m benchmarks.check_resume".
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.synthetic_archive import create_archive
+from sensor_community_data.archive_server import ArchiveServer
+from sensor_community_data.preprocessor import Preprocessor
+from sensor_community_data.scraper import Scraper
+
+# Cities spread over the area of the synthetic sensors, used to geocode the sensors offline.
+gazetteer = pd.DataFrame({
+    "city": ["Stuttgart", "Munich", "Berlin", "Hamburg", "Cologne", "Frankfurt"],
+    "country": "Germany",
+    "lat": [48.78, 48.14, 52.52, 53.55, 50.94, 50.11],
+    "lng": [9.18, 11.58, 13.40, 9.99, 6.96, 8.68]
+})
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt():
+    raise Interrupted()
+
+
+# Scraping the days into the save path, piping the data into a preprocessor unless raw_path is given. If interrupted
+# is true, the run stops before the data held back by the preprocessor is finished.
+def scrape(archive_url, start_date, end_date, save_path, freq, raw_path=None, interrupted=False):
+    preprocessor = None
+    if not raw_path:
+        preprocessor = Preprocessor(save_path, combine_city_data=True, resample_freq=freq, clean_data=True,
+                                    gazetteer_path="gazetteer.csv", incremental=True)
+
+    scraper = Scraper(["P1", "P2"], "sds011", start_date=start_date, end_date=end_date, save_path=raw_path,
+                      preprocessor=preprocessor, archive_url=archive_url, listing_cache_path=None, resume=True)
+
+    if interrupted:
+        preprocessor.finish = interrupt
+
+    try:
+        scraper.start()
+    except Interrupted:
+        logging.info(f"Interrupted the run from {start_date} to {end_date}")
+
+
+# Return the dataframes of the files in the save path by file name.
+def read_output(save_path):
+    return {data_file.name: pd.read_csv(data_file) for data_file in sorted(Path(save_path).glob("*.csv"))}
+
+
+# Return the names of the files that differ between the outputs, including files only found in one of them.
+def compare_outputs(output, expected_output):
+    return sorted(name for name in set(output) | set(expected_output)
+                  if name not in output or name not in expected_output
+                  or not is_equal(output[name], expected_output[name]))
+
+
+# Return true if the dataframes have the same columns and timestamps and values that differ by at most the tolerance.
+def is_equal(df, expected_df, tolerance=0.011):
+    if list(df.columns) != list(expected_df.columns) or not df["timestamp"].equals(expected_df["timestamp"]):
+        return False
+
+    value_columns = df.columns.drop("timestamp")
+    return (df[value_columns] - expected_df[value_columns]).abs().max().max() <= tolerance
+
+
+# Checking the output of each scenario against the single piped run on the archive for each frequency. Return the
+# number of outputs that differ.
+def check_archive(archive, start_date, end_date, interrupt_date, freqs):
+    failures = 0
+    with ArchiveServer(archive) as server:
+        scrape(server.url, start_date, end_date, None, None, raw_path=f"{archive}_raw")
+
+        for freq in freqs:
+            output_path = f"{archive}_{freq}"
+            scrape(server.url, start_date, end_date, f"{output_path}_piped", freq)
+
+            scrape(server.url, start_date, interrupt_date, f"{output_path}_resumed", freq, interrupted=True)
+            scrape(server.url, start_date, end_date, f"{output_path}_resumed", freq)
+
+            scrape(server.url, start_date, interrupt_date, f"{output_path}_synced", freq)
+            scrape(server.url, start_date, end_date, f"{output_path}_synced", freq)
+
+            Preprocessor(f"{output_path}_full", data_folder=f"{archive}_raw", combine_city_data=True,
+                         resample_freq=freq, clean_data=True, gazetteer_path="gazetteer.csv", incremental=True).start()
+
+            expected_output = read_output(f"{output_path}_piped")
+            for scenario in ["full", "resumed", "synced"]:
+                differing_files = compare_outputs(read_output(f"{output_path}_{scenario}"), expected_output)
+                failures += bool(differing_files)
+
+                result = f"differs in {', '.join(differing_files)}" if differing_files else "identical"
+                print(f"{archive:<10}{freq:<6}{scenario:<10}{result}")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that piped, resumed and full range output are identical.")
+    parser.add_argument("--days", type=int, default=4, help="Days in the synthetic archive.")
+    parser.add_argument("--sensors", type=int, default=20, help="Sensors per day.")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per sensor file.")
+    parser.add_argument("--interrupt-after", type=int, default=2, help="Days scraped before the interruption.")
+    parser.add_argument("--freqs", nargs="+", default=["60T", "7H"], help="The resampling frequencies to check.")
+    parser.add_argument("--sparse-rows", type=int, default=15, help="Rows per sensor file in the sparse archive, or 0 "
+                                                                    "to skip the sparse archive.")
+    parser.add_argument("--sparse-freqs", nargs="+", default=["10T"], help="The resampling frequencies to check on "
+                                                                           "the sparse archive.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    start_date = date(2020, 1, 1)
+    end_date = start_date + timedelta(args.days - 1)
+    interrupt_date = start_date + timedelta(args.interrupt_after - 1)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Running in the temporary folder, so the caches of the project are not changed.
+        os.chdir(tmpdir)
+        gazetteer.to_csv("gazetteer.csv", index=False)
+
+        create_archive("archive", args.days, args.sensors, args.rows, start_date)
+        failures = check_archive("archive", start_date, end_date, interrupt_date, args.freqs)
+
+        if args.sparse_rows:
+            create_archive("sparse", args.days, args.sensors, args.sparse_rows, start_date)
+            failures += check_archive("sparse", start_date, end_date, interrupt_date, args.sparse_freqs)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Generator of synthetic archives with the same layout as the sensor community data archive: a folder per day with a
+";" separated CSV file per sensor, named like "2020-01-01_sds011_sensor_140.csv". Serve the generated folder with
+:class:`ArchiveServer` to scrape it like the real archive.
+
+Run from the project root with "python -m benchmarks.synthetic_archive path/to/archive" to generate an archive.
+"""
+import argparse
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# The columns of the SDS011 files in the archive, in the order they appear in the files.
+sds011_columns = ["sensor_id", "sensor_type", "location", "lat", "lon", "timestamp", "P1", "durP1", "ratioP1", "P2",
+                  "durP2", "ratioP2"]
+
+
+# Generating an archive in the folder with the given number of days, sensors per day and rows per file. A fraction of
+# the sensors are indoor sensors and each day also contains files from another sensor type, so the scraper filters
+# have files to remove. Return the number of files and rows in the SDS011 outdoor files.
+def create_archive(root, days=3, sensors=50, rows=1000, start_date=date(2020, 1, 1), indoor_fraction=0.05,
+                   other_sensors=0.2, seed=0):
+    rng = np.random.default_rng(seed)
+    sensor_ids = np.arange(1000, 1000 + sensors)
+    indoor = rng.random(sensors) < indoor_fraction
+    coordinates = np.column_stack([rng.uniform(47, 55, sensors), rng.uniform(6, 15, sensors)]).round(3)
+
+    files = 0
+    total_rows = 0
+    for day in range(days):
+        current_date = start_date + timedelta(day)
+        day_path = Path(root, str(current_date))
+        day_path.mkdir(parents=True, exist_ok=True)
+
+        for i, sensor_id in enumerate(sensor_ids):
+            df = create_sensor_dataframe(current_date, sensor_id, coordinates[i], rows, rng)
+            suffix = "_indoor" if indoor[i] else ""
+            df.to_csv(day_path.joinpath(f"{current_date}_sds011_sensor_{sensor_id}{suffix}.csv"), sep=";",
+                      index=False)
+
+            if not indoor[i]:
+                files += 1
+                total_rows += len(df)
+
+        # Files from another sensor type, which only contain a header since they are never downloaded.
+        for sensor_id in range(100000, 100000 + int(sensors * other_sensors)):
+            day_path.joinpath(f"{current_date}_bme280_sensor_{sensor_id}.csv").write_text("sensor_id;timestamp\n")
+
+    return files, total_rows
+
+
+# Return the data from a single SDS011 sensor on a single day, with sorted timestamps and a few outliers.
+def create_sensor_dataframe(current_date, sensor_id, coordinate, rows, rng):
+    seconds = np.sort(rng.integers(0, 86400, rows))
+    timestamps = pd.Timestamp(current_date) + pd.to_timedelta(seconds, unit="s")
+
+    p1 = rng.gamma(2, 10, rows).round(2)
+    p2 = (p1 * rng.uniform(0.3, 0.7, rows)).round(2)
+    p1[rng.integers(0, rows, max(rows // 500, 1))] = 999.9
+
+    return pd.DataFrame({
+        "sensor_id": sensor_id,
+        "sensor_type": "SDS011",
+        "location": sensor_id * 10,
+        "lat": coordinate[0],
+        "lon": coordinate[1],
+        "timestamp": timestamps.strftime("%Y-%m-%dT%H:%M:%S"),
+        "P1": p1,
+        "durP1": "",
+        "ratioP1": "",
+        "P2": p2,
+        "durP2": "",
+        "ratioP2": ""
+    }, columns=sds011_columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic sensor community data archive.")
+    parser.add_argument("root", help="Folder the archive is generated in.")
+    parser.add_argument("--days", type=int, default=3, help="Days in the archive.")
+    parser.add_argument("--sensors", type=int, default=50, help="SDS011 sensors per day.")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per sensor file.")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date(2020, 1, 1), help="The first day.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random data.")
+    args = parser.parse_args()
+
+    files, rows = create_archive(args.root, args.days, args.sensors, args.rows, args.start_date, seed=args.seed)
+    print(f"Generated {args.days} days with {files} outdoor SDS011 files and {rows} rows in {args.root}")
+
+
+if __name__ == "__main__":
+    main()
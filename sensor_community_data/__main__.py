@@ -0,0 +1,3 @@
+from sensor_community_data.cli import main
+
+main()
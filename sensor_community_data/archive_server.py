@@ -0,0 +1,65 @@
+import functools
+import logging
+import random
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ArchiveServer:
+    """
+    Local stand-in for the sensor community data archive, serving a folder with the same layout as the archive (one
+    folder per day containing the sensor CSV files) over HTTP. Directory requests are answered with index pages that
+    link to the files in the folder, like the index pages of the real archive. Used to run the scraper against
+    local data when testing and benchmarking.
+
+    Attributes
+    ----------
+    url : str
+        The url of the archive root, to be given to the scraper as its archive url.
+
+    Parameters
+    ----------
+    root : str
+        The path to the folder that should be served.
+    port : int, optional
+        The port to listen on (the default is 0, meaning a free port is chosen).
+    failure_rate : float, optional
+        The fraction of requests that are answered with "503 Service Unavailable" instead of the requested content,
+        used to exercise the retry logic (the default is 0).
+    """
+    def __init__(self, root, port=0, failure_rate=0):
+        handler = functools.partial(_ArchiveRequestHandler, directory=root)
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.failure_rate = failure_rate
+        self.server.daemon_threads = True
+
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.__thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.__thread.start()
+        logging.info(f"Serving local archive at {self.url}")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class _ArchiveRequestHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if random.random() < self.server.failure_rate:
+            self.send_error(503)
+        else:
+            super().do_GET()
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
@@ -0,0 +1,178 @@
+import hashlib
+import io
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+# Pandas is only imported by the functions that need it, so the command line can read the manifest without loading it.
+
+
+class Manifest:
+    """
+    Checkpoint manifest recording which units of work are done, so an interrupted run can be resumed without repeating
+    the finished work. A unit is a day, such as "day/2020-01-01", or the data from a location on a day, such as
+    "2020-01-01/Stuttgart_Germany", and is stored together with the number of rows and a hash of the saved data. The
+    manifest also records the last timestamp written to each output file, so appending to the file never duplicates
+    rows, and the resampling state of the file, holding the origin of its buckets, the rows of a last bucket that is
+    not written yet and the last written bucket, which empty buckets are filled from, so later runs continue with the
+    same buckets and filled values.
+
+    The manifest is stored in an SQLite database in the folder. Only the entries recorded since the last save are
+    written when the manifest is saved, so saving takes the same time no matter how large the manifest has grown.
+
+    Parameters
+    ----------
+    path : str
+        The path to the folder the manifest is saved in.
+    """
+    def __init__(self, path):
+        self.path = Path(path).joinpath("manifest.sqlite")
+
+        self.__pending_units = {}
+        self.__pending_timestamps = {}
+        self.__pending_resample_states = {}
+        self.__connection = None
+        self.__lock = threading.Lock()
+
+    def is_complete(self, unit):
+        with self.__lock:
+            if unit in self.__pending_units:
+                return True
+
+            return self.__connect().execute("SELECT 1 FROM units WHERE unit = ?", (unit,)).fetchone() is not None
+
+    def complete(self, unit, rows, content_hash=None):
+        with self.__lock:
+            self.__pending_units[unit] = (rows, content_hash)
+
+    def get_last_timestamp(self, output):
+        import pandas as pd
+
+        with self.__lock:
+            timestamp = self.__pending_timestamps.get(output)
+            if timestamp is None:
+                row = self.__connect().execute("SELECT last_timestamp FROM outputs WHERE output = ?",
+                                               (output,)).fetchone()
+                timestamp = row[0] if row else None
+
+        return pd.Timestamp(timestamp) if timestamp else None
+
+    def set_last_timestamp(self, output, timestamp):
+        with self.__lock:
+            self.__pending_timestamps[output] = str(timestamp)
+
+    # Return the resampling state of the output as a tuple of the origin of its buckets, the rows of its last bucket, or
+    # None if the last bucket is written, and the last written bucket. Returns None if the output has no resampling
+    # state.
+    def get_resample_state(self, output):
+        import pandas as pd
+
+        with self.__lock:
+            row = self.__pending_resample_states.get(output)
+            if row is None:
+                row = self.__connect().execute("SELECT origin, carry_over, dtypes, last_bucket FROM resample_states "
+                                               "WHERE output = ?", (output,)).fetchone()
+
+        if row is None:
+            return None
+
+        origin, carry_over, dtypes, last_bucket = row
+        if carry_over is not None:
+            dtypes = json.loads(dtypes)
+            carry_over = pd.read_csv(io.StringIO(carry_over), parse_dates=["timestamp"], float_precision="round_trip",
+                                     dtype={column: dtype for column, dtype in dtypes.items() if column != "timestamp"})
+
+        if last_bucket is not None:
+            last_bucket = json.loads(last_bucket)
+            last_bucket["timestamp"] = pd.Timestamp(last_bucket["timestamp"])
+
+        return pd.Timestamp(origin), carry_over, last_bucket
+
+    # Recording the resampling state of the output. The rows of the last bucket are stored as CSV with all digits of
+    # the values, so they are restored exactly.
+    def set_resample_state(self, output, state):
+        origin, carry_over, last_bucket = state
+        if last_bucket is not None:
+            last_bucket = json.dumps({**last_bucket, "timestamp": str(last_bucket["timestamp"])})
+
+        if carry_over is None:
+            row = (str(origin), None, None, last_bucket)
+        else:
+            row = (str(origin), carry_over.to_csv(index=False, float_format="%.17g"),
+                   json.dumps({column: str(dtype) for column, dtype in carry_over.dtypes.items()}), last_bucket)
+
+        with self.__lock:
+            self.__pending_resample_states[output] = row
+
+    # Writing the units, timestamps and resampling states recorded since the last save to the database in a single
+    # transaction, so an interrupted run never leaves a partly saved manifest.
+    def save(self):
+        with self.__lock:
+            pending_units, self.__pending_units = self.__pending_units, {}
+            pending_timestamps, self.__pending_timestamps = self.__pending_timestamps, {}
+            pending_resample_states, self.__pending_resample_states = self.__pending_resample_states, {}
+
+            connection = self.__connect()
+            with connection:
+                # Keeping the record of the first run if a unit is completed again.
+                connection.executemany("INSERT OR IGNORE INTO units (unit, rows, hash) VALUES (?, ?, ?)",
+                                       [(unit, *values) for unit, values in pending_units.items()])
+                connection.executemany("INSERT OR REPLACE INTO outputs (output, last_timestamp) VALUES (?, ?)",
+                                       pending_timestamps.items())
+                connection.executemany("INSERT OR REPLACE INTO resample_states "
+                                       "(output, origin, carry_over, dtypes, last_bucket) VALUES (?, ?, ?, ?, ?)",
+                                       [(output, *row) for output, row in pending_resample_states.items()])
+
+    # Return a dict with the number of completed days, the last completed day, the number of completed location days,
+    # the number of locations with completed days and the last timestamp of each output.
+    def summary(self):
+        if not self.path.is_file():
+            return {"days": 0, "last_day": None, "location_days": 0, "locations": 0, "last_timestamps": {}}
+
+        with self.__lock:
+            connection = self.__connect()
+            days, last_day = connection.execute("SELECT COUNT(*), MAX(SUBSTR(unit, 5)) FROM units "
+                                                "WHERE unit LIKE 'day/%'").fetchone()
+            location_days, locations = connection.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT SUBSTR(unit, INSTR(unit, '/') + 1)) FROM units "
+                "WHERE unit NOT LIKE 'day/%'").fetchone()
+            last_timestamps = connection.execute("SELECT output, last_timestamp FROM outputs "
+                                                 "ORDER BY output").fetchall()
+
+        return {"days": days, "last_day": last_day, "location_days": location_days, "locations": locations,
+                "last_timestamps": dict(last_timestamps)}
+
+    def close(self):
+        with self.__lock:
+            if self.__connection:
+                self.__connection.close()
+                self.__connection = None
+
+    def __connect(self):
+        if self.__connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            # The connection is shared between threads, with the lock serializing its use.
+            self.__connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            with self.__connection:
+                self.__connection.execute("CREATE TABLE IF NOT EXISTS units "
+                                          "(unit TEXT PRIMARY KEY, rows INTEGER, hash TEXT)")
+                self.__connection.execute("CREATE TABLE IF NOT EXISTS outputs "
+                                          "(output TEXT PRIMARY KEY, last_timestamp TEXT)")
+                self.__connection.execute("CREATE TABLE IF NOT EXISTS resample_states "
+                                          "(output TEXT PRIMARY KEY, origin TEXT, carry_over TEXT, dtypes TEXT, "
+                                          "last_bucket TEXT)")
+
+        return self.__connection
+
+
+# Return a hash of the content of the dataframes, independent of their index.
+def hash_dataframes(dataframes):
+    import pandas as pd
+
+    content_hash = hashlib.sha256()
+    for df in dataframes:
+        content_hash.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+
+    return content_hash.hexdigest()
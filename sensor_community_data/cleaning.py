@@ -0,0 +1,59 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# The timestamp format used in the files in the sensor community data archive.
+timestamp_format = "%Y-%m-%dT%H:%M:%S"
+
+
+# Return the series converted to timezone naive timestamps, parsing strings with the archive format if possible.
+def parse_timestamps(series):
+    if not pd.api.types.is_datetime64_any_dtype(series):
+        try:
+            series = pd.to_datetime(series, format=timestamp_format)
+        except ValueError:
+            series = pd.to_datetime(series)
+
+    if series.dt.tz is not None:
+        series = series.dt.tz_localize(None)
+
+    return series
+
+
+# Replace data collected during New Years Eve and outliers in all measurement columns of the dataframe at once.
+def clean_measurements(df, date):
+    measurements = [column for column in df.columns if column != "timestamp"]
+    if not measurements:
+        return
+
+    values = df[measurements].to_numpy(dtype=np.float64, copy=True)
+
+    # Replacing data collected during New Years Eve if necessary.
+    # We consider 12/31-18:00 - 01/01/12:00 as New Years Eve.
+    if date[-5:] in ("12-31", "01-01"):
+        hours = df["timestamp"].dt.hour.to_numpy()
+        new_years_eve = hours >= 18 if date[-5:] == "12-31" else hours < 12
+
+        new_years_eve_medians = _nanmedian(values[~new_years_eve])
+        values[new_years_eve] = new_years_eve_medians
+
+    # Replacing outliers with the median using Z-score outlier detection. Columns with missing values are left
+    # unchanged since their Z-scores are undefined.
+    medians = _nanmedian(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zscores = np.abs((values - values.mean(axis=0)) / values.std(axis=0))
+
+    outliers = zscores > 3
+    values = np.where(outliers, medians, values)
+
+    for i, measurement in enumerate(measurements):
+        dtype = df[measurement].dtype
+        df[measurement] = values[:, i].astype(dtype) if np.issubdtype(dtype, np.floating) else values[:, i]
+
+
+# Column-wise median ignoring missing values, returning NaN for columns without any values.
+def _nanmedian(values):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmedian(values, axis=0)
@@ -0,0 +1,229 @@
+import argparse
+import json
+import logging
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from sensor_community_data.checkpoint import Manifest
+
+# The scraper and preprocessor, together with pandas, requests, scipy and pycountry, are only imported by the commands
+# that run them, so commands such as "status" and "--help" start without loading them.
+
+# Settings in the profiles that are converted to dates.
+date_settings = ["start_date", "end_date"]
+
+
+# Return the scraper and preprocessor settings of the profile with the given name in the profiles file.
+def load_profile(path, name):
+    with open(path, "r") as profilesfile:
+        profiles = json.load(profilesfile)
+
+    if name not in profiles:
+        raise ValueError(f"Unknown profile '{name}' in {path}, expected one of {sorted(profiles)}")
+
+    profile = profiles[name]
+    unknown_sections = set(profile) - {"scraper", "preprocessor"}
+    if unknown_sections:
+        raise ValueError(f"Unknown sections {sorted(unknown_sections)} in the profile '{name}', expected 'scraper' "
+                         f"and 'preprocessor'")
+
+    return {section: {key: _parse_date(value) if key in date_settings else value for key, value in settings.items()}
+            for section, settings in profile.items()}
+
+
+# Return the date given either as an ISO date or as a number of days relative to today, such as -1 for yesterday.
+def _parse_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    elif isinstance(value, int):
+        return date.today() + timedelta(value)
+    else:
+        return date.fromisoformat(value)
+
+
+def scrape(args, profile):
+    scraper_settings = dict(profile.get("scraper", {}))
+    preprocessor_settings = profile.get("preprocessor") if not args.raw_only else None
+
+    if args.command == "sync":
+        # Only adding the days that are not in the manifest, up to and including yesterday.
+        scraper_settings["resume"] = True
+        scraper_settings.setdefault("end_date", date.today() - timedelta(1))
+        if preprocessor_settings:
+            preprocessor_settings = dict(preprocessor_settings, incremental=True)
+    elif args.resume:
+        scraper_settings["resume"] = True
+
+    _override_dates(scraper_settings, args)
+
+    if not scraper_settings.get("save_path") and not preprocessor_settings:
+        raise ValueError("The profile needs a scraper save path or preprocessor settings to scrape")
+
+    from sensor_community_data.scraper import Scraper
+
+    preprocessor = None
+    if preprocessor_settings:
+        from sensor_community_data.preprocessor import Preprocessor
+        preprocessor = Preprocessor(**preprocessor_settings)
+
+    scraper = Scraper(preprocessor=preprocessor, **scraper_settings)
+    scraper.metrics.record("startup", time.perf_counter() - args.started)
+    scraper.start()
+
+    save_path = preprocessor_settings["save_path"] if preprocessor else scraper_settings["save_path"]
+    scraper.metrics.save_json(Path(save_path, "metrics.json"))
+
+
+# Preprocessing the data scraped to the scraper save path, unless the profile gives another data folder.
+def preprocess(args, profile):
+    preprocessor_settings = dict(profile.get("preprocessor", {}))
+    preprocessor_settings.setdefault("data_folder", profile.get("scraper", {}).get("save_path"))
+
+    if args.incremental:
+        preprocessor_settings["incremental"] = True
+
+    _override_dates(preprocessor_settings, args)
+
+    if not preprocessor_settings.get("save_path") or not preprocessor_settings["data_folder"]:
+        raise ValueError("The profile needs a preprocessor save path and a data folder or scraper save path to "
+                         "preprocess")
+
+    from sensor_community_data.preprocessor import Preprocessor
+
+    preprocessor = Preprocessor(**preprocessor_settings)
+    preprocessor.metrics.record("startup", time.perf_counter() - args.started)
+    preprocessor.start()
+
+    preprocessor.metrics.save_json(Path(preprocessor_settings["save_path"], "metrics.json"))
+
+
+# Printing the progress recorded in the manifests and the metrics of the last run in the save paths of the profile,
+# only reading the manifests and metrics files so the status is available without loading the scraper or preprocessor.
+def status(args, profile):
+    save_paths = args.path or list(dict.fromkeys(
+        settings["save_path"] for settings in profile.values() if settings.get("save_path")))
+
+    if not save_paths:
+        raise ValueError("The profile has no save paths, give the paths to show the status of")
+
+    statuses = {str(save_path): get_status(save_path) for save_path in save_paths}
+
+    if args.json:
+        print(json.dumps(statuses, indent=2))
+        return
+
+    for save_path, path_status in statuses.items():
+        print(save_path)
+
+        if path_status["days"]:
+            print(f"  scraped days: {path_status['days']}, last {path_status['last_day']}")
+        if path_status["location_days"]:
+            print(f"  preprocessed location days: {path_status['location_days']} in "
+                  f"{path_status['locations']} locations")
+        for location, timestamp in path_status["last_timestamps"].items():
+            print(f"  last timestamp in {location}: {timestamp}")
+
+        last_run = path_status["last_run"]
+        if last_run:
+            counters = ", ".join(f"{name} {value}" for name, value in last_run["counters"].items())
+            print(f"  last run: finished {last_run['finished']} after {last_run['elapsed_seconds']:.1f}s"
+                  f"{', ' + counters if counters else ''}")
+
+        if not any(path_status.values()):
+            print("  nothing scraped or preprocessed yet")
+
+
+# Return a dict summarizing the manifest and the metrics of the last run in the save path.
+def get_status(save_path):
+    manifest = Manifest(save_path)
+    path_status = manifest.summary()
+    manifest.close()
+
+    metrics_path = Path(save_path, "metrics.json")
+    metrics = _read_json(metrics_path)
+    if metrics:
+        finished = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(metrics_path.stat().st_mtime))
+        last_run = {"finished": finished, "elapsed_seconds": metrics["elapsed_seconds"],
+                    "counters": metrics["counters"]}
+    else:
+        last_run = None
+
+    return dict(path_status, last_run=last_run)
+
+
+def _read_json(path):
+    if not path.is_file():
+        return None
+
+    with open(path, "r") as jsonfile:
+        return json.load(jsonfile)
+
+
+# Replacing the dates of the settings with the dates given on the command line.
+def _override_dates(settings, args):
+    for setting in date_settings:
+        if getattr(args, setting, None):
+            settings[setting] = getattr(args, setting)
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(prog="sensor_community_data",
+                                     description="Scrape and preprocess data from the sensor community archive, "
+                                                 "configured by a profile in a profiles file.")
+    parser.add_argument("--config", default="profiles.json", help="The profiles file (default: profiles.json).")
+    parser.add_argument("--profile", default="default", help="The profile to use (default: default).")
+    parser.add_argument("--log-level", default="INFO", help="The logging level (default: INFO).")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scrape_parser = subparsers.add_parser("scrape", help="Scrape the archive, piping the data into the preprocessor "
+                                                         "if the profile has preprocessor settings.")
+    sync_parser = subparsers.add_parser("sync", help="Scrape and preprocess only the days that are not done yet, up "
+                                                     "to and including yesterday.")
+    preprocess_parser = subparsers.add_parser("preprocess", help="Preprocess the scraped data folder.")
+    status_parser = subparsers.add_parser("status", help="Show the scraped and preprocessed days and the last run.")
+
+    for subparser in [scrape_parser, sync_parser, preprocess_parser]:
+        subparser.add_argument("--start-date", type=date.fromisoformat, help="Override the first day.")
+        subparser.add_argument("--end-date", type=date.fromisoformat, help="Override the last day.")
+
+    for subparser in [scrape_parser, sync_parser]:
+        subparser.add_argument("--raw-only", action="store_true", help="Only save the scraped data, even if the "
+                                                                       "profile has preprocessor settings.")
+        subparser.set_defaults(handler=scrape)
+
+    scrape_parser.add_argument("--resume", action="store_true", help="Skip the days that are already scraped.")
+    preprocess_parser.add_argument("--incremental", action="store_true", help="Skip the days that are already "
+                                                                              "preprocessed.")
+    preprocess_parser.set_defaults(handler=preprocess)
+
+    status_parser.add_argument("path", nargs="*", help="Save paths to show instead of the save paths in the profile.")
+    status_parser.add_argument("--json", action="store_true", help="Print the status as JSON.")
+    status_parser.set_defaults(handler=status)
+
+    return parser
+
+
+def main(argv=None):
+    started = time.perf_counter()
+    parser = create_parser()
+    args = parser.parse_args(argv)
+    args.started = started
+
+    logging.basicConfig(level=args.log_level.upper())
+
+    # The status of explicitly given paths does not need a profile.
+    if args.command == "status" and args.path and not Path(args.config).is_file():
+        profile = {}
+    else:
+        try:
+            profile = load_profile(args.config, args.profile)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+
+    args.handler(args, profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Downloader:
+    """
+    Class handling all HTTP traffic to the sensor community data archive. A single keep-alive session is shared between
+    all requests so connections are reused, the number of requests in flight is bounded and failed requests are retried
+    with exponential backoff.
+
+    Attributes
+    ----------
+    session : requests.Session
+        The shared session. The connection pool is sized to the maximum number of connections.
+    executor : concurrent.futures.ThreadPoolExecutor
+        The worker pool that bounds the number of requests in flight.
+
+    Parameters
+    ----------
+    max_connections : int, optional
+        The maximum number of concurrent requests (the default is 16).
+    max_retries : int, optional
+        The number of times a failed request is retried before the error is raised (the default is 5).
+    backoff_factor : float, optional
+        The base delay in seconds between retries. The delay is doubled after each failed attempt (the default is 0.5).
+    requests_per_second : float, optional
+        The maximum number of requests per second sent to a single host (the default is None, meaning no limit).
+    timeout : float, optional
+        The number of seconds to wait for the server before a request is considered failed (the default is 60).
+    """
+    retry_status_codes = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_connections=16, max_retries=5, backoff_factor=0.5, requests_per_second=None, timeout=60):
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.requests_per_second = requests_per_second
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_connections)
+
+        self.__rate_lock = threading.Lock()
+        self.__next_request_times = {}
+
+    # Apply the function to each item concurrently, with at most max_connections items in flight at once.
+    def map(self, func, items):
+        return list(self.executor.map(func, items))
+
+    def get_text(self, url):
+        return self.get(url).text
+
+    def get_content(self, url):
+        return self.get(url).content
+
+    # Send a GET request, retrying connection errors and temporary server errors with exponential backoff.
+    def get(self, url, headers=None):
+        for attempt in range(self.max_retries + 1):
+            self.__wait_for_rate_limit(url)
+
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(f"Request to {url} failed ({e}), retrying")
+                time.sleep(self.__get_backoff(attempt))
+                continue
+
+            if response.status_code in self.retry_status_codes and attempt < self.max_retries:
+                logging.warning(f"Request to {url} returned {response.status_code}, retrying")
+                time.sleep(self.__get_backoff(attempt, response.headers.get("Retry-After")))
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+
+    # Return the number of seconds to wait before the next attempt, respecting the Retry-After header if given.
+    def __get_backoff(self, attempt, retry_after=None):
+        backoff = self.backoff_factor * 2 ** attempt
+
+        if retry_after and retry_after.isdigit():
+            backoff = max(backoff, int(retry_after))
+
+        return backoff
+
+    # Block until the host of the url can receive another request without exceeding the rate limit.
+    def __wait_for_rate_limit(self, url):
+        if not self.requests_per_second:
+            return
+
+        host = urlsplit(url).netloc
+        with self.__rate_lock:
+            now = time.monotonic()
+            request_time = max(now, self.__next_request_times.get(host, now))
+            self.__next_request_times[host] = request_time + 1 / self.requests_per_second
+
+        if request_time > now:
+            time.sleep(request_time - now)
@@ -0,0 +1,59 @@
+import collections
+
+# The metadata of a file in the archive, as given by a file name such as "2017-01-01_sds011_sensor_140_indoor.csv".
+ArchiveFile = collections.namedtuple("ArchiveFile", ["date", "sensor_type", "sensor_id", "indoor"])
+
+
+# Return the metadata of the file linked to by the url, or None if the url does not link to a sensor CSV file.
+def parse_archive_file(file_url):
+    file_name = file_url.rsplit("/", 1)[-1]
+    if not file_name.endswith(".csv"):
+        return None
+
+    split_file_name = file_name[:-4].split("_")
+    if len(split_file_name) < 4 or not split_file_name[3].isdigit():
+        return None
+
+    return ArchiveFile(split_file_name[0], split_file_name[1], int(split_file_name[3]), "indoor" in split_file_name[4:])
+
+
+class FileFilter:
+    """
+    Filter removing the archive files that should not be scraped. Each file name is parsed once and checked against
+    sets that are prepared when the filter is created, so filtering is linear in the number of files. If a sensor type
+    is given, the urls without the sensor type in the file name are removed before parsing, which removes most files
+    at the cost of a substring search.
+
+    Parameters
+    ----------
+    sensor_type : str, optional
+        The sensor type that should be kept (the default is None, meaning all sensor types are kept).
+    sensor_ids : list of int, optional
+        The sensors that should be kept (the default is None, meaning all sensor ids are kept).
+    remove_indoor : bool, optional
+        If true, files from indoor sensors are removed (the default is True).
+    location_sensor_ids : iterable of str or int, optional
+        The sensors in the location that should be collected from (the default is None, meaning sensors from all
+        locations are kept).
+    """
+    def __init__(self, sensor_type=None, sensor_ids=None, remove_indoor=True, location_sensor_ids=None):
+        self.sensor_type = sensor_type
+        self.sensor_ids = frozenset(int(sensor_id) for sensor_id in sensor_ids) if sensor_ids else None
+        self.remove_indoor = remove_indoor
+        self.location_sensor_ids = frozenset(int(sensor_id) for sensor_id in location_sensor_ids) \
+            if location_sensor_ids is not None else None
+
+    # Return the urls linking to files that should be scraped.
+    def filter(self, file_urls):
+        # A file of the sensor type always has the sensor type between underscores in its name.
+        if self.sensor_type:
+            file_urls = [file_url for file_url in file_urls if f"_{self.sensor_type}_" in file_url]
+
+        return [file_url for file_url in file_urls if self.__is_wanted(parse_archive_file(file_url))]
+
+    def __is_wanted(self, archive_file):
+        return (archive_file is not None
+                and (self.location_sensor_ids is None or archive_file.sensor_id in self.location_sensor_ids)
+                and (not self.sensor_type or archive_file.sensor_type == self.sensor_type)
+                and (not self.sensor_ids or archive_file.sensor_id in self.sensor_ids)
+                and not (self.remove_indoor and archive_file.indoor))
@@ -0,0 +1,156 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from sensor_community_data.downloader import Downloader
+from sensor_community_data.metrics import Metrics
+
+# The mean radius of the earth in meters, used to convert between distances and coordinates on the unit sphere.
+earth_radius = 6371000
+
+
+class Geocoder:
+    """
+    Class resolving coordinates to locations with the format "city_country". Coordinates close to a sensor with a known
+    location are resolved using a spatial index over the known sensors, and the remaining coordinates are resolved
+    concurrently using either the Google Maps reverse geocoding API or, in offline mode, the nearest city in a local
+    gazetteer file.
+
+    Parameters
+    ----------
+    location_cache : :class:`LocationCache`
+        The location cache holding the known locations and coordinates of sensors, which are used to build the spatial
+        index. Newly resolved locations and coordinates are added to the cache.
+    api_key : str, optional
+        The API key used to make requests to the Google Maps API (the default is None, meaning the API is not used).
+    max_distance : float, optional
+        The maximum distance in meters to a sensor with a known location for a coordinate to be given the same location
+        (the default is 100).
+    gazetteer_path : str, optional
+        The path to a CSV file with the columns "city", "country", "lat" and "lng". If given, coordinates are resolved
+        offline to the nearest city in the file instead of using the API (the default is None).
+    max_requests : int, optional
+        The maximum number of concurrent requests to the API (the default is 8).
+    requests_per_second : float, optional
+        The maximum number of requests per second sent to the API (the default is 10).
+    metrics : :class:`Metrics`, optional
+        The metrics the location cache hits and misses and the number of resolved sensors are counted in (the default
+        is None, meaning the geocoder counts in its own metrics).
+    """
+    def __init__(self, location_cache, api_key=None, max_distance=100, gazetteer_path=None, max_requests=8,
+                 requests_per_second=10, metrics=None):
+        self.location_cache = location_cache
+        self.api_key = api_key
+        self.max_distance = max_distance
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        if gazetteer_path:
+            gazetteer_df = pd.read_csv(gazetteer_path)
+            self.gazetteer_locations = (gazetteer_df["city"] + "_" + gazetteer_df["country"]).tolist()
+            self.gazetteer_tree = cKDTree(self.__to_unit_vectors(gazetteer_df[["lat", "lng"]].to_numpy()))
+        else:
+            self.gazetteer_tree = None
+
+        self.downloader = Downloader(max_connections=max_requests, requests_per_second=requests_per_second)
+
+    # Return a dict with key-value pairs of the format "sensor_id-location" for the given sensor coordinates.
+    def resolve(self, sensor_coordinates):
+        sensor_locations = {}
+        misses = {}
+
+        for sensor_id, (lat, lng) in sensor_coordinates.items():
+            if sensor_id not in self.location_cache.coordinates:
+                self.location_cache.set_coordinates(sensor_id, lat, lng)
+
+            if sensor_id in self.location_cache:
+                sensor_locations[sensor_id] = self.location_cache[sensor_id]
+            else:
+                misses[sensor_id] = (lat, lng)
+
+        self.metrics.increment("location_cache_hits", len(sensor_locations))
+        self.metrics.increment("location_cache_misses", len(misses))
+
+        if misses:
+            nearby_locations = self.__get_nearby_locations(misses)
+            sensor_locations.update(nearby_locations)
+
+            misses = {sensor_id: point for sensor_id, point in misses.items() if sensor_id not in nearby_locations}
+            self.metrics.increment("geocoding_nearby", len(nearby_locations))
+            logging.info(f"Resolved {len(nearby_locations)} sensors from nearby sensors, {len(misses)} remaining")
+
+        unresolved = {}
+        if misses and self.gazetteer_tree:
+            sensor_locations.update(zip(misses, self.__lookup_gazetteer(list(misses.values()))))
+            self.metrics.increment("geocoding_gazetteer", len(misses))
+        elif misses and self.api_key:
+            sensor_locations.update(zip(misses, self.downloader.map(lambda point: self.__reverse_geocode(*point),
+                                                                    misses.values())))
+            self.metrics.increment("geocoding_requests", len(misses))
+        elif misses:
+            logging.warning(f"Cannot resolve the locations of {len(misses)} sensors without a Google Maps API key or "
+                            f"a gazetteer, so their data is skipped")
+            unresolved = misses
+            self.metrics.increment("geocoding_unresolved", len(misses))
+
+        # Saving the newly retrieved values in the cache.
+        for sensor_id, location in sensor_locations.items():
+            if sensor_id not in self.location_cache:
+                self.location_cache[sensor_id] = location
+
+        # The sensors that could not be looked up are given no location in this run, but are not cached, so they are
+        # resolved in a later run when an API key or gazetteer is available.
+        sensor_locations.update(dict.fromkeys(unresolved, ""))
+
+        return sensor_locations
+
+    # Return the locations of the sensors that are within the maximum distance of a sensor with a known location.
+    def __get_nearby_locations(self, points):
+        coordinates = self.location_cache.coordinates
+        known_sensor_ids = [sensor_id for sensor_id in coordinates
+                            if self.location_cache.get(sensor_id) and sensor_id not in points]
+        if not known_sensor_ids:
+            return {}
+
+        known_points = np.array([coordinates[sensor_id] for sensor_id in known_sensor_ids])
+        tree = cKDTree(self.__to_unit_vectors(known_points))
+
+        # The chord length between two points on the unit sphere corresponding to the maximum distance.
+        max_chord = 2 * np.sin(self.max_distance / earth_radius / 2)
+        distances, indices = tree.query(self.__to_unit_vectors(np.array(list(points.values()), dtype=float)),
+                                        distance_upper_bound=max_chord)
+
+        return {sensor_id: self.location_cache[known_sensor_ids[index]]
+                for sensor_id, distance, index in zip(points, distances, indices) if np.isfinite(distance)}
+
+    def __lookup_gazetteer(self, points):
+        _, indices = self.gazetteer_tree.query(self.__to_unit_vectors(np.array(points, dtype=float)))
+        return [self.gazetteer_locations[index] for index in indices]
+
+    # Return a string with the format "city_country" based on the given latitude and longitude.
+    def __reverse_geocode(self, lat, lng):
+        logging.debug(f"Reverse geocoding {lat}, {lng}")
+        maps_api_url = "https://maps.googleapis.com/maps/api/geocode/json?"
+        result_type = "&result_type=locality&result_type=political"
+        key = f"&key={self.api_key}"
+
+        # Making a request to the Google Maps reverse geocoding API.
+        api_response = self.downloader.get(f"{maps_api_url}latlng={lat},{lng}{result_type}{key}").json()
+
+        try:
+            address_comp = api_response["results"][0]["address_components"]
+
+            # Extracting the city and country name by filtering on the address component type.
+            city = list(filter(lambda x: x["types"] == ["locality", "political"], address_comp))[0]["long_name"]
+            country = list(filter(lambda x: x["types"] == ["country", "political"], address_comp))[0]["long_name"]
+
+            return f"{city}_{country}"
+        except IndexError:
+            return ""
+
+    # Convert latitudes and longitudes in degrees to points on the unit sphere, so euclidean distances can be used.
+    @staticmethod
+    def __to_unit_vectors(points):
+        lat, lng = np.radians(points[:, 0]), np.radians(points[:, 1])
+        return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
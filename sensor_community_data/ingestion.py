@@ -0,0 +1,73 @@
+import pandas as pd
+
+from sensor_community_data.cleaning import parse_timestamps
+
+csv_engines = ["c", "pyarrow"]
+
+
+class CsvReader:
+    """
+    Reader loading sensor CSV files from the archive into dataframes with compact types. Measurements are read as
+    float32, the location id as a categorical and timestamps are parsed with the archive format while reading, so the
+    data is never held as strings. Large files can be read in chunks, which bounds the memory used for the parsing
+    itself to a single chunk.
+
+    Parameters
+    ----------
+    measurements : list of str
+        The measurements that should be read. All other measurements are skipped.
+    engine : {"c", "pyarrow"}, optional
+        The parser engine used to read the files. "pyarrow" requires the pyarrow package and parses files using
+        multiple threads, but cannot read in chunks (the default is "c").
+    chunksize : int, optional
+        The number of rows parsed at a time (the default is None, meaning each file is parsed at once).
+    """
+    def __init__(self, measurements, engine="c", chunksize=None):
+        if engine not in csv_engines:
+            raise ValueError(f"Unknown CSV engine '{engine}', expected one of {csv_engines}")
+        if engine == "pyarrow":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ImportError("The pyarrow package is required to use the pyarrow CSV engine")
+            if chunksize:
+                raise ValueError("The pyarrow CSV engine cannot read files in chunks")
+
+        self.measurements = measurements
+        self.columns = ["location", "lat", "lon", "timestamp"] + measurements
+        self.engine = engine
+        self.chunksize = chunksize
+
+    # Return the data in the file, which can be a path or a file-like object, as a dataframe with compact types.
+    def read(self, source):
+        dtype = {measurement: "float32" for measurement in self.measurements}
+
+        try:
+            df = self.__read_chunks(source, dtype)
+        except ValueError:
+            # Falling back to converting the measurements after reading if a file contains values that are not numbers.
+            if hasattr(source, "seek"):
+                source.seek(0)
+            df = self.__read_chunks(source, {})
+
+            for measurement in self.measurements:
+                df[measurement] = pd.to_numeric(df[measurement], errors="coerce").astype("float32")
+
+        df["location"] = df["location"].astype("category")
+
+        return df
+
+    def __read_chunks(self, source, dtype):
+        if not self.chunksize:
+            return self.__parse_timestamps(pd.read_csv(source, sep=";", usecols=self.columns, dtype=dtype,
+                                                       engine=self.engine))
+
+        chunks = pd.read_csv(source, sep=";", usecols=self.columns, dtype=dtype, engine=self.engine,
+                             chunksize=self.chunksize)
+
+        return pd.concat([self.__parse_timestamps(chunk) for chunk in chunks], ignore_index=True)
+
+    @staticmethod
+    def __parse_timestamps(df):
+        df["timestamp"] = parse_timestamps(df["timestamp"])
+        return df
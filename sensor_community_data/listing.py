@@ -0,0 +1,89 @@
+import html
+import json
+import logging
+import re
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+
+# Patterns matching comments, the start tags of links and the attributes within a start tag, following the rules used
+# by the html.parser module so the extracted hrefs are the same as when parsing the full page.
+comment_pattern = re.compile(r"<!--.*?-->", re.DOTALL)
+anchor_pattern = re.compile(r"""<a(?=[\s/>])((?:"[^"]*"|'[^']*'|[^'">])*)>""", re.IGNORECASE)
+attribute_pattern = re.compile(r"""((?<=['"\s/])[^\s/>][^\s/=>]*)(\s*=+\s*('[^']*'|"[^"]*"|(?!['"])[^>\s]*))?""")
+
+
+# Return the hrefs of the links in the html page, in the order they appear on the page. The page is scanned for link
+# start tags without building a document tree.
+def extract_hrefs(page):
+    if "<!--" in page:
+        page = comment_pattern.sub("", page)
+
+    hrefs = []
+    for anchor_match in anchor_pattern.finditer(page):
+        href = None
+
+        # If the href attribute is given multiple times, the last value is used.
+        for attribute_match in attribute_pattern.finditer(anchor_match.group(1)):
+            if attribute_match.group(1).lower() == "href":
+                href = attribute_match.group(3) or ""
+
+        if href is not None:
+            if href[:1] == href[-1:] and href[:1] in ("'", '"'):
+                href = href[1:-1]
+            hrefs.append(html.unescape(href))
+
+    return hrefs
+
+
+class ListingCache:
+    """
+    Persistent cache of the links on the index pages of the archive, with one entry per day. Days in the past never
+    change in the archive, so their index pages only have to be downloaded and parsed once. The cache is stored in an
+    SQLite database shared by all runs, with the links of each day stored compressed since the file names in a day are
+    very similar.
+
+    Parameters
+    ----------
+    path : str, optional
+        The path to the SQLite database (the default is "cache/listing_cache.sqlite").
+    """
+    def __init__(self, path="cache/listing_cache.sqlite"):
+        self.path = Path(path)
+
+        self.__connection = None
+        self.__lock = threading.Lock()
+
+    # Return the hrefs on the index page at the url, or None if the page is not in the cache.
+    def get(self, url):
+        with self.__lock:
+            row = self.__connect().execute("SELECT hrefs FROM listings WHERE url = ?", (url,)).fetchone()
+
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def set(self, url, hrefs):
+        with self.__lock:
+            connection = self.__connect()
+            with connection:
+                connection.execute("INSERT OR REPLACE INTO listings (url, hrefs) VALUES (?, ?)",
+                                   (url, zlib.compress(json.dumps(hrefs).encode())))
+
+        logging.debug(f"Added {len(hrefs)} hrefs from {url} to the listing cache")
+
+    def close(self):
+        with self.__lock:
+            if self.__connection:
+                self.__connection.close()
+                self.__connection = None
+
+    def __connect(self):
+        if self.__connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            # The connection is shared between the threads listing days, with the lock serializing its use.
+            self.__connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            with self.__connection:
+                self.__connection.execute("CREATE TABLE IF NOT EXISTS listings (url TEXT PRIMARY KEY, hrefs BLOB)")
+
+        return self.__connection
@@ -0,0 +1,163 @@
+import collections
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+
+
+class LocationCache:
+    """
+    Persistent cache from sensor ids to the city and country connected to the id, together with the coordinates of the
+    sensor if they are known. The cache is stored in an SQLite database, which is created from the JSON location cache
+    the first time it is used. The database is only read when the cache is first accessed, and new entries are written
+    in a single transaction when the cache is saved, so saving never rewrites the full cache and concurrent processes
+    can safely save to the same database.
+
+    Use :meth:`get_instance` to get the cache, so the cache is only loaded once per process.
+
+    Parameters
+    ----------
+    path : str, optional
+        The path to the SQLite database (the default is "cache/location_cache.sqlite").
+    json_path : str, optional
+        The path to the JSON location cache used to create the database (the default is "cache/location_cache.json").
+    """
+    __instances = {}
+    __instances_lock = threading.Lock()
+
+    def __init__(self, path="cache/location_cache.sqlite", json_path="cache/location_cache.json"):
+        self.path = Path(path)
+        self.json_path = Path(json_path)
+
+        self.__locations = None
+        self.__coordinates = None
+        self.__location_sensor_ids = None
+        self.__pending = {}
+        self.__lock = threading.RLock()
+
+    # Return the shared cache for the database at the given path, creating it if necessary.
+    @classmethod
+    def get_instance(cls, path="cache/location_cache.sqlite", json_path="cache/location_cache.json"):
+        with cls.__instances_lock:
+            key = Path(path).resolve()
+            if key not in cls.__instances:
+                cls.__instances[key] = cls(path, json_path)
+
+            return cls.__instances[key]
+
+    def __contains__(self, sensor_id):
+        return sensor_id in self.__get_locations()
+
+    def __getitem__(self, sensor_id):
+        return self.__get_locations()[sensor_id]
+
+    def __setitem__(self, sensor_id, location):
+        with self.__lock:
+            locations = self.__get_locations()
+            previous_location = locations.get(sensor_id)
+            locations[sensor_id] = location
+
+            self.__location_sensor_ids[previous_location].discard(sensor_id)
+            self.__location_sensor_ids[location].add(sensor_id)
+            self.__pending[sensor_id] = (location, *self.__coordinates.get(sensor_id, (None, None)))
+
+    def __len__(self):
+        return len(self.__get_locations())
+
+    def get(self, sensor_id, default=None):
+        return self.__get_locations().get(sensor_id, default)
+
+    # Return the set of sensor ids connected to the given location, using the inverted index of the cache.
+    def sensor_ids(self, location):
+        self.__get_locations()
+        return frozenset(self.__location_sensor_ids.get(location, ()))
+
+    # Return a dict with key-value pairs of the format "sensor_id-(latitude, longitude)" for the sensors with known
+    # coordinates.
+    @property
+    def coordinates(self):
+        self.__get_locations()
+        return self.__coordinates
+
+    def set_coordinates(self, sensor_id, lat, lng):
+        with self.__lock:
+            self.__get_locations()
+            self.__coordinates[sensor_id] = (float(lat), float(lng))
+            self.__pending[sensor_id] = (self.__locations.get(sensor_id), float(lat), float(lng))
+
+    # Writing the entries changed since the last save to the database in a single transaction.
+    def save(self):
+        with self.__lock:
+            pending, self.__pending = self.__pending, {}
+
+        if not pending:
+            return
+
+        # Only overwriting the known values so entries saved by other processes in the meantime are kept.
+        with closing(self.__connect()) as connection, connection:
+            connection.executemany("INSERT INTO sensors (sensor_id, location, lat, lng) VALUES (?, ?, ?, ?) "
+                                   "ON CONFLICT (sensor_id) DO UPDATE SET "
+                                   "location = COALESCE(excluded.location, location), "
+                                   "lat = COALESCE(excluded.lat, lat), lng = COALESCE(excluded.lng, lng)",
+                                   [(sensor_id, *values) for sensor_id, values in pending.items()])
+        logging.info(f"Saved {len(pending)} entries to the location cache")
+
+    def __get_locations(self):
+        if self.__locations is None:
+            with self.__lock:
+                if self.__locations is None:
+                    self.__load()
+
+        return self.__locations
+
+    def __load(self):
+        with closing(self.__connect()) as connection:
+            rows = connection.execute("SELECT sensor_id, location, lat, lng FROM sensors").fetchall()
+
+        locations = {}
+        coordinates = {}
+        location_sensor_ids = collections.defaultdict(set)
+
+        for sensor_id, location, lat, lng in rows:
+            if location is not None:
+                locations[sensor_id] = location
+                location_sensor_ids[location].add(sensor_id)
+            if lat is not None:
+                coordinates[sensor_id] = (lat, lng)
+
+        self.__coordinates = coordinates
+        self.__location_sensor_ids = location_sensor_ids
+        self.__locations = locations
+
+    def __connect(self):
+        is_new = not self.path.is_file()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Waiting for other processes to finish writing instead of failing if the database is locked.
+        connection = sqlite3.connect(self.path, timeout=60)
+
+        # The table is created on every connection, since another process can create the file before its table. Only
+        # the import is limited to new databases, and it is safe to repeat since existing entries are ignored.
+        with connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS sensors "
+                               "(sensor_id TEXT PRIMARY KEY, location TEXT, lat REAL, lng REAL)")
+
+            if is_new:
+                self.__import_json(connection)
+
+        return connection
+
+    # Filling a new database with the entries from the JSON location cache.
+    def __import_json(self, connection):
+        if not self.json_path.is_file():
+            return
+
+        with open(self.json_path, "r") as location_cachefile:
+            location_cache = json.load(location_cachefile)
+
+        connection.executemany("INSERT OR IGNORE INTO sensors (sensor_id, location) VALUES (?, ?)",
+                               location_cache.items())
+        logging.info(f"Created location cache {self.path} with {len(location_cache)} entries from {self.json_path}")
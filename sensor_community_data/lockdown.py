@@ -0,0 +1,122 @@
+import functools
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pycountry
+
+lockdown_url = ("https://raw.githubusercontent.com/OxCGRT/covid-policy-tracker/master/data/timeseries/"
+                "c6_stay_at_home_requirements.csv")
+
+
+class LockdownTable:
+    """
+    Table specifying whether a country was locked down on a specific day, as given by the stay at home requirements in
+    the Oxford government response tracker. The data is downloaded once, converted into a dense (country x day) array
+    and cached in persistent storage, so later runs can load it without network access.
+
+    Attributes
+    ----------
+    country_codes : dict
+        Dictionary from ISO 3166 alpha-3 country codes to the row of the country in the lockdown array.
+    first_date : numpy.datetime64
+        The day corresponding to the first column of the lockdown array.
+    lockdowns : numpy.ndarray
+        Boolean array with a row per country and a column per day, true if the country was locked down on the day.
+
+    Parameters
+    ----------
+    cache_path : str, optional
+        The path to the persistent storage of the table (the default is "cache/lockdown_cache.npz").
+    refresh : bool, optional
+        If true, the data is downloaded again even if the table is cached (the default is False).
+    source : str, optional
+        The url or path of the stay at home requirements CSV file from the Oxford government response tracker, used to
+        build the table if it is not cached (the default is the file in the tracker GitHub repository).
+    """
+    # Incremented when the format of the cached table changes, so old caches are rebuilt instead of misread.
+    version = 1
+
+    def __init__(self, cache_path="cache/lockdown_cache.npz", refresh=False, source=lockdown_url):
+        self.cache_path = Path(cache_path)
+
+        if not refresh and self.__load_cache():
+            logging.info(f"Loaded lockdown table from {self.cache_path}")
+        else:
+            self.__build_table(pd.read_csv(source))
+            self.__save_cache()
+
+    # Return an array with a 1 for each timestamp where the country was locked down and a 0 otherwise.
+    def lookup(self, country, timestamps):
+        timestamps = np.asarray(timestamps, dtype="datetime64[D]")
+        lockdown = np.zeros(len(timestamps), dtype=int)
+
+        row = self.country_codes.get(get_alpha_3_code(country))
+        if row is None:
+            return lockdown
+
+        days = (timestamps - self.first_date).astype(int)
+        known_days = (days >= 0) & (days < self.lockdowns.shape[1])
+        lockdown[known_days] = self.lockdowns[row, days[known_days]]
+
+        return lockdown
+
+    def __build_table(self, lockdown_df):
+        # Only using the first row of each country since the rows after that are for regions within the country.
+        lockdown_df = lockdown_df.drop_duplicates("country_code")
+
+        date_columns = [column for column in lockdown_df.columns if _is_date_column(column)]
+        dates = pd.to_datetime(date_columns, format="%d%b%Y")
+
+        self.first_date = np.datetime64(dates.min().date(), "D")
+        days = ((dates - dates.min()).days).to_numpy()
+
+        # The current threshold for what is considered a "lockdown" (any stay at home requirements).
+        self.lockdowns = np.zeros((len(lockdown_df), days.max() + 1), dtype=bool)
+        self.lockdowns[:, days] = lockdown_df[date_columns].to_numpy(dtype=float) > 0
+
+        self.country_codes = {code: row for row, code in enumerate(lockdown_df["country_code"])}
+
+    def __load_cache(self):
+        if not self.cache_path.is_file():
+            return False
+
+        with np.load(self.cache_path) as cache:
+            if cache["version"] != self.version:
+                return False
+
+            self.first_date = cache["first_date"][()]
+            self.lockdowns = cache["lockdowns"]
+            self.country_codes = {code: row for row, code in enumerate(cache["country_codes"].tolist())}
+
+        return True
+
+    # Atomically writing the table to persistent storage.
+    def __save_cache(self):
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile(dir=self.cache_path.parent, suffix=".npz", delete=False) as tmpfile:
+            np.savez_compressed(tmpfile, version=self.version, first_date=self.first_date, lockdowns=self.lockdowns,
+                                country_codes=np.array(list(self.country_codes), dtype=str))
+
+        os.replace(tmpfile.name, self.cache_path)
+
+
+# Return the ISO 3166 alpha-3 code of the country, or None if the country is unknown.
+@functools.lru_cache(maxsize=None)
+def get_alpha_3_code(country):
+    try:
+        return pycountry.countries.lookup(country).alpha_3
+    except LookupError:
+        return None
+
+
+def _is_date_column(column):
+    try:
+        pd.to_datetime(column, format="%d%b%Y")
+        return True
+    except ValueError:
+        return False
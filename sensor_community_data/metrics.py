@@ -0,0 +1,161 @@
+import collections
+import contextlib
+import cProfile
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+
+class Metrics:
+    """
+    Collection of timing spans and counters describing where the time of a run goes and how much work it did. Spans
+    record the number of calls and the total time spent in each stage, such as "download" or "resample", and counters
+    record amounts such as the number of downloaded bytes or cache hits. Spans from concurrent calls overlap, so the
+    total time of a span is the busy time summed over all threads and can be longer than the run itself.
+
+    Metrics recorded in worker processes are collected in separate instances that are merged into the main instance.
+    """
+    def __init__(self):
+        self.spans = collections.defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+        self.counters = collections.Counter()
+        self.started = time.time()
+
+        self.__lock = threading.Lock()
+
+    # Time the code in the with block, adding the time to the span with the given name.
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    # Adding a call with the given time to the span, for time measured outside a with block.
+    def record(self, name, seconds):
+        with self.__lock:
+            self.spans[name]["calls"] += 1
+            self.spans[name]["seconds"] += seconds
+
+    def increment(self, name, value=1):
+        with self.__lock:
+            self.counters[name] += value
+
+    # Adding the spans and counters recorded in another instance, such as an instance from a worker process.
+    def merge(self, metrics):
+        with self.__lock:
+            for name, span in metrics.spans.items():
+                self.spans[name]["calls"] += span["calls"]
+                self.spans[name]["seconds"] += span["seconds"]
+
+            self.counters.update(metrics.counters)
+
+    # Return a dict with the elapsed time of the run and a copy of the spans and counters.
+    def summary(self):
+        with self.__lock:
+            return {
+                "elapsed_seconds": time.time() - self.started,
+                "spans": {name: span.copy() for name, span in sorted(self.spans.items())},
+                "counters": dict(sorted(self.counters.items()))
+            }
+
+    def save_json(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(path, "w") as metricsfile:
+            json.dump(self.summary(), metricsfile, indent=2)
+
+    # Writing the metrics in the Prometheus text format, for example to be picked up by the textfile collector of the
+    # node exporter.
+    def save_prometheus(self, path, prefix="sensor_community"):
+        summary = self.summary()
+
+        lines = [f"# TYPE {prefix}_elapsed_seconds gauge", f"{prefix}_elapsed_seconds {summary['elapsed_seconds']}"]
+        for field in ["calls", "seconds"]:
+            lines.append(f"# TYPE {prefix}_span_{field}_total counter")
+            lines += [f'{prefix}_span_{field}_total{{span="{name}"}} {span[field]}'
+                      for name, span in summary["spans"].items()]
+
+        for name, value in summary["counters"].items():
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as metricsfile:
+            metricsfile.write("\n".join(lines) + "\n")
+
+    # Leaving out the lock when the metrics are sent between processes.
+    def __getstate__(self):
+        return {"spans": dict(self.spans), "counters": self.counters, "started": self.started}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.spans.update(state["spans"])
+        self.counters = state["counters"]
+        self.started = state["started"]
+
+
+class ProgressReporter:
+    """
+    Reporter logging the progress of a run from the counters of its metrics, at most once per interval so reporting
+    stays cheap no matter how often it is called.
+
+    Attributes
+    ----------
+    totals : dict
+        Dictionary from counter names to the expected final value of the counter, which is included in the progress
+        when known.
+
+    Parameters
+    ----------
+    metrics : :class:`Metrics`
+        The metrics the progress is read from.
+    counters : list of str
+        The counters that are included in the progress.
+    interval : float, optional
+        The minimum number of seconds between two progress reports (the default is 10).
+    """
+    def __init__(self, metrics, counters, interval=10):
+        self.metrics = metrics
+        self.counters = counters
+        self.interval = interval
+        self.totals = {}
+
+        self.__last_report = time.monotonic()
+        self.__lock = threading.Lock()
+
+    # Logging the progress if the interval has passed since the last report, or always if force is true.
+    def report(self, force=False):
+        now = time.monotonic()
+        with self.__lock:
+            if not force and now - self.__last_report < self.interval:
+                return
+            self.__last_report = now
+
+        elapsed = time.time() - self.metrics.started
+        progress = []
+        for name in self.counters:
+            value = self.metrics.counters[name]
+            total = f"/{self.totals[name]}" if name in self.totals else ""
+            progress.append(f"{name} {value}{total} ({value / elapsed:.1f}/s)")
+
+        logging.info(f"Progress after {elapsed:.0f}s: {', '.join(progress)}")
+
+
+# Profile the code in the with block with cProfile and save the statistics to the path, if a path is given. Only the
+# calling thread is profiled, so work done in thread pools is only included through the time spent waiting for it.
+@contextlib.contextmanager
+def profile(path=None):
+    if not path:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        logging.info(f"Saved profile to {path}, which can be read with the pstats module")
@@ -0,0 +1,184 @@
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The errors raised when decompressing a damaged object.
+decompression_errors = (OSError, EOFError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+class Mirror:
+    """
+    Local mirror of the files in the sensor community data archive. Raw files are stored compressed and content
+    addressed, meaning files with identical content are only stored once, and an index keeps track of which archive
+    files are present together with their size and the HTTP validators (ETag and Last-Modified) that were returned
+    when they were downloaded. A mirrored copy is only used if it has the recorded size, so missing or damaged copies
+    are downloaded again.
+
+    The index is stored in an SQLite database in the folder, keyed by the path of each file relative to the archive
+    url. Only the entries added since the last save are written when the index is saved, so saving takes the same time
+    no matter how large the mirror has grown.
+
+    Parameters
+    ----------
+    path : str
+        The path to the folder containing the mirror.
+    compression : {"gzip", "zstd"}, optional
+        The compression used for new files. "zstd" requires the zstandard package (the default is "gzip").
+    revalidate : bool, optional
+        If true, files present in the mirror are revalidated with a conditional request and downloaded again if they
+        have changed in the archive (the default is False, meaning files in the mirror are always used).
+    """
+    extensions = {"gzip": "gz", "zstd": "zst"}
+
+    def __init__(self, path, compression="gzip", revalidate=False):
+        if compression not in self.extensions:
+            raise ValueError(f"Unknown compression '{compression}', expected one of {list(self.extensions)}")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("The zstandard package is required to use zstd compression")
+
+        self.path = Path(path)
+        self.compression = compression
+        self.revalidate = revalidate
+
+        self.index_path = self.path.joinpath("index.sqlite")
+
+        self.__pending_entries = {}
+        self.__connection = None
+        self.__lock = threading.Lock()
+
+    # Return the content of the file, using the mirrored copy if possible and otherwise downloading and mirroring it.
+    def fetch(self, downloader, url, key):
+        entry = self.__get_entry(key)
+        mirrored_content = self.__read_object(entry) if entry else None
+
+        # Downloading the file again without validators if the mirrored copy is missing or damaged.
+        if mirrored_content is None:
+            entry = None
+
+        if entry and not self.revalidate:
+            logging.debug(f"Using mirrored copy of {url}")
+            return mirrored_content
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = downloader.get(url, headers=headers)
+
+        if entry and response.status_code == 304:
+            logging.debug(f"Mirrored copy of {url} is up to date")
+            return mirrored_content
+
+        content = response.content
+        self.__write_object(key, content, response.headers)
+
+        return content
+
+    # Writing the entries added since the last save to the index in a single transaction, so an interrupted run never
+    # leaves a partly saved index behind.
+    def save_index(self):
+        with self.__lock:
+            pending_entries, self.__pending_entries = self.__pending_entries, {}
+
+            connection = self.__connect()
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO files (key, object, size, etag, last_modified) "
+                                       "VALUES (?, ?, ?, ?, ?)",
+                                       [(key, entry["object"], entry["size"], entry["etag"], entry["last_modified"])
+                                        for key, entry in pending_entries.items()])
+
+    def close(self):
+        with self.__lock:
+            if self.__connection:
+                self.__connection.close()
+                self.__connection = None
+
+    # Return the index entry of the file, or None if the file is not in the mirror.
+    def __get_entry(self, key):
+        with self.__lock:
+            if key in self.__pending_entries:
+                return self.__pending_entries[key]
+
+            row = self.__connect().execute("SELECT object, size, etag, last_modified FROM files WHERE key = ?",
+                                           (key,)).fetchone()
+
+        return dict(zip(["object", "size", "etag", "last_modified"], row)) if row else None
+
+    # Return the content of the mirrored copy, or None if the copy is missing, cannot be decompressed or does not have
+    # the recorded size. Damaged copies are removed, so they are written again when the file is downloaded.
+    def __read_object(self, entry):
+        object_path = self.path.joinpath(entry["object"])
+        if not object_path.is_file():
+            logging.warning(f"Mirrored copy {object_path} is missing")
+            return None
+
+        with open(object_path, "rb") as objectfile:
+            data = objectfile.read()
+
+        try:
+            if entry["object"].endswith(self.extensions["zstd"]):
+                content = zstandard.ZstdDecompressor().decompress(data)
+            else:
+                content = gzip.decompress(data)
+        except decompression_errors as e:
+            logging.warning(f"Mirrored copy {object_path} could not be decompressed: {e}")
+            object_path.unlink(missing_ok=True)
+            return None
+
+        if len(content) != entry["size"]:
+            logging.warning(f"Mirrored copy {object_path} has {len(content)} bytes instead of {entry['size']}")
+            object_path.unlink(missing_ok=True)
+            return None
+
+        return content
+
+    def __write_object(self, key, content, headers):
+        content_hash = hashlib.sha256(content).hexdigest()
+        object_name = f"objects/{content_hash[:2]}/{content_hash}.{self.extensions[self.compression]}"
+        object_path = self.path.joinpath(object_name)
+
+        # Identical files are only stored once.
+        if not object_path.is_file():
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+
+            if self.compression == "zstd":
+                data = zstandard.ZstdCompressor().compress(content)
+            else:
+                data = gzip.compress(content)
+
+            # Writing to a temporary file first so a partially written object is never referenced by the index.
+            with tempfile.NamedTemporaryFile("wb", dir=object_path.parent, suffix=".tmp", delete=False) as tmpfile:
+                tmpfile.write(data)
+            os.replace(tmpfile.name, object_path)
+
+        with self.__lock:
+            self.__pending_entries[key] = {
+                "object": object_name,
+                "size": len(content),
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified")
+            }
+
+    def __connect(self):
+        if self.__connection is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+            # The connection is shared between the download threads, with the lock serializing its use.
+            self.__connection = sqlite3.connect(self.index_path, timeout=60, check_same_thread=False)
+            with self.__connection:
+                self.__connection.execute("CREATE TABLE IF NOT EXISTS files (key TEXT PRIMARY KEY, object TEXT, "
+                                          "size INTEGER, etag TEXT, last_modified TEXT)")
+
+        return self.__connection
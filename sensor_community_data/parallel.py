@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+backends = ["serial", "threads", "processes"]
+
+
+# Return an executor running work with the given backend. All executors support "map" and the context manager protocol.
+# If an initializer is given, it is called with the initargs once in each worker before the worker runs any work.
+def create_executor(backend, workers=None, initializer=None, initargs=()):
+    if backend == "serial":
+        return SerialExecutor(initializer, initargs)
+    elif backend == "threads":
+        return ThreadPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+    elif backend == "processes":
+        return ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+    else:
+        raise ValueError(f"Unknown execution backend '{backend}', expected one of {backends}")
+
+
+class SerialExecutor:
+    """
+    Executor running all work in the calling thread, with the same interface as the executors in concurrent.futures.
+    Useful for debugging and profiling, and when the work is too small to benefit from parallelism.
+
+    Parameters
+    ----------
+    initializer : callable, optional
+        Called with the initargs in the calling thread when the executor is created (the default is None).
+    initargs : tuple, optional
+        The arguments given to the initializer (the default is ()).
+    """
+    def __init__(self, initializer=None, initargs=()):
+        if initializer:
+            initializer(*initargs)
+
+    @staticmethod
+    def map(func, *iterables):
+        return map(func, *iterables)
+
+    def shutdown(self, wait=True):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
@@ -1,16 +1,20 @@
-import calendar
 import collections
+import hashlib
 import json
 import logging
-import os
-from multiprocessing.dummy import Pool
+import threading
 from pathlib import Path
 
-import numpy as np
-import pandas as pd
-import pycountry
-import requests
-from scipy import stats
+from sensor_community_data.checkpoint import Manifest, hash_dataframes
+from sensor_community_data.cleaning import clean_measurements, parse_timestamps
+from sensor_community_data.location_cache import LocationCache
+from sensor_community_data.metrics import Metrics
+from sensor_community_data.parallel import create_executor
+from sensor_community_data.resampler import StreamingResampler, merge_sorted
+from sensor_community_data.storage import create_storage, load_dataframe, load_dataframes, parse_data_file
+
+# The preprocessor used by the tasks in a worker process, which is sent to the worker once when the worker starts.
+_worker_preprocessor = None
 
 
 class Preprocessor:
@@ -20,11 +24,26 @@ class Preprocessor:
 
     Attributes
     ----------
-    location_cache : dict
-        Dictionary from sensor ids to the city and country connected to the id. The cache is loaded from persistent
-        storage on initialization and saved again when preprocessing is done.
-    api_key : str
-        The API key used to make requests to the Google Maps API, which is used for reverse geocoding.
+    location_cache : :class:`LocationCache`
+        Cache from sensor ids to the city and country connected to the id. The cache is shared with the scraper, loaded
+        from persistent storage when first used and new entries are saved when preprocessing is done.
+    api_key : str or None
+        The API key used to make requests to the Google Maps API, which is used for reverse geocoding. The key is read
+        from "config.json" if the file exists, when it is first used.
+    geocoder : :class:`Geocoder`
+        The geocoder used to find the locations of sensors that are not in the location cache, created when first
+        used.
+    lockdown_table : :class:`LockdownTable`
+        The table of lockdowns used to add lockdown info, loaded when first used.
+    manifest : :class:`Manifest`
+        The checkpoint manifest in the save path, recording which days have been preprocessed for each location and
+        the last timestamp written to each combined city file.
+    resample_states : dict
+        Dictionary from locations to the resampling state of the combined city data, holding the data from the last
+        resampling bucket until it is finished by the next batch of data. The states are also recorded in the
+        manifest together with the finished days, so an interrupted run is resumed with the held back data.
+    metrics : :class:`Metrics`
+        The timing spans and counters of the preprocessing, including the metrics recorded in worker processes.
 
     Parameters
     ----------
@@ -42,82 +61,401 @@ class Preprocessor:
         The offset string representing target conversion (the default is None, meaning no resampling is done).
     add_lockdown_info : bool, optional
         If true, a column is added to the data with a 1 if the specific row was collected during a lockdown and a 0
-        otherwise (the default is False).
+        otherwise. The lockdown data is cached in "cache/lockdown_cache.npz" after it is downloaded the first time
+        (the default is False).
+    refresh_lockdown_info : bool, optional
+        If true, the lockdown data is downloaded again instead of read from the cache, to include days added to the
+        tracker since the data was cached (the default is False).
     clean_data : bool, optional
         if true, clean the data using Z-score outlier detection and replace data from New Years Eve if necessary
         (the default is false).
+    backend : {"serial", "threads", "processes"}, optional
+        How the data from each location is processed. "threads" processes locations concurrently in a thread pool,
+        while "processes" shards the locations across worker processes so the CPU-bound work can use all cores. The
+        workers are started once and reused by each call to start until the data is finished (the default is
+        "threads").
+    workers : int, optional
+        The number of worker threads or processes (the default is None, meaning the executor default is used).
+    storage_format : {"csv", "parquet"}, optional
+        The format the data in the data folder is stored in and the format the preprocessed data is saved in. The
+        parquet format requires the pyarrow package (the default is "csv").
+    measurements : list of str, optional
+        The measurements that should be loaded from the data folder (the default is None, meaning all columns are
+        loaded).
+    start_date : datetime.date, optional
+        The first day that should be loaded from the data folder (the default is None, meaning no lower bound).
+    end_date : datetime.date, optional
+        The last day that should be loaded from the data folder (the default is None, meaning no upper bound).
+    locations : list of str, optional
+        The city-countries that should be loaded from the data folder. Uses the location cache to choose the relevant
+        sensors (the default is None, meaning all locations are loaded).
+    geocoding_distance : float, optional
+        The maximum distance in meters to a sensor with a known location for a new sensor to be given the same
+        location without reverse geocoding (the default is 100).
+    gazetteer_path : str, optional
+        The path to a CSV file with the columns "city", "country", "lat" and "lng". If given, new sensors are given the
+        location of the nearest city in the file instead of using the Google Maps API (the default is None).
+    incremental : bool, optional
+        If true, data from days that have already been preprocessed for a location, according to the checkpoint
+        manifest, is skipped so only new dates are added to the existing data. When the data is finished, a last
+        resampling bucket of the combined city data that continues into the following day is kept in the manifest
+        instead of saved, so the next run finishes it with the data from the following days (the default is False).
+    out_of_core : bool, optional
+        If true, the files in the data folder are not loaded when the preprocessor is created. Instead the files are
+        grouped by sensor and location using their file names, and the files from a location are only loaded when the
+        location is processed, so the memory used is bounded by the data from the locations processed at the same time
+        instead of the full data folder. The output is the same as when all files are loaded (the default is False).
+    window_days : int, optional
+        The number of days of data from a location that are loaded and processed at a time in out of core mode, which
+        bounds the memory used by the size of a window instead of a location, with the same output as processing the
+        location at once (the default is None, meaning all data from a location is processed at once).
     """
     def __init__(self, save_path, data_folder=None, dataframes=None, combine_city_data=False, resample_freq=None,
-                 add_lockdown_info=False, clean_data=False):
-        with open("cache/location_cache.json", "r") as location_cachefile:
-            self.location_cache = json.load(location_cachefile)
-
-        with open("config.json", "r") as configfile:
-            self.api_key = json.load(configfile)['maps_api_key']
+                 add_lockdown_info=False, clean_data=False, backend="threads", workers=None, storage_format="csv",
+                 measurements=None, start_date=None, end_date=None, locations=None, geocoding_distance=100,
+                 gazetteer_path=None, incremental=False, out_of_core=False, window_days=None,
+                 refresh_lockdown_info=False):
+        self.location_cache = LocationCache.get_instance()
+        self.metrics = Metrics()
+
+        self.geocoding_distance = geocoding_distance
+        self.gazetteer_path = gazetteer_path
+
+        # The API key, geocoder and lockdown table are only loaded when first used, so runs that do not need them do
+        # not pay for reading them.
+        self.__api_key = None
+        self.__geocoder = None
+        self.__lockdown_table = None
+        self.__lock = threading.Lock()
+
+        # The executor is kept between calls to start while more data is expected, so the workers are only started
+        # once per run.
+        self.__executor = None
 
         self.save_path = save_path
         self.combine_city_data = combine_city_data
         self.resample_freq = resample_freq
         self.add_lockdown_info = add_lockdown_info
+        self.refresh_lockdown_info = refresh_lockdown_info
         self.clean_data = clean_data
-
-        # Manually loading dataframes if a data location was given.
+        self.backend = backend
+        self.workers = workers
+        self.storage_format = storage_format
+        self.storage = create_storage(storage_format)
+        self.incremental = incremental
+        self.manifest = Manifest(save_path)
+        self.resample_states = {}
+
+        if out_of_core and not data_folder:
+            raise ValueError("The out of core mode requires a data folder")
+
+        self.out_of_core = out_of_core
+        self.window_days = window_days
+        self.measurements = measurements
+        self.filters = {"start_date": start_date, "end_date": end_date, "locations": locations}
+
+        # Manually loading dataframes if a data location was given, only reading the files and columns that are needed.
+        # In out of core mode, the files are instead loaded when their location is processed.
         if data_folder:
             self.data_folder = Path(data_folder)
-            self.dataframes = self.__get_dataframes()
+
+        if data_folder and not out_of_core:
+            with self.metrics.span("load"):
+                self.dataframes = load_dataframes(self.storage, self.data_folder, measurements,
+                                                  location_lookup=self.location_cache.get, **self.filters)
         else:
             self.dataframes = dataframes
 
-        # Load lockdown info from the oxford government response tracker if necessary.
-        if self.add_lockdown_info:
-            lockdown_file = "c6_stay_at_home_requirements.csv"
-            self.lockdown_df = pd.read_csv(
-                f"https://raw.githubusercontent.com/OxCGRT/covid-policy-tracker/master/data/timeseries/{lockdown_file}")
+    @property
+    def api_key(self):
+        if self.__api_key is None and Path("config.json").is_file():
+            with open("config.json", "r") as configfile:
+                self.__api_key = json.load(configfile)['maps_api_key']
+
+        return self.__api_key
+
+    @property
+    def geocoder(self):
+        with self.__lock:
+            if self.__geocoder is None:
+                from sensor_community_data.geocoder import Geocoder
 
-    # Parse through all csv files in the given data folder and load them into dataframes.
-    def __get_dataframes(self):
-        dataframes = []
-        for data_file in self.data_folder.rglob("*.csv"):
-            df = pd.read_csv(data_file)
+                self.__geocoder = Geocoder(self.location_cache, self.api_key, max_distance=self.geocoding_distance,
+                                           gazetteer_path=self.gazetteer_path, metrics=self.metrics)
 
-            split_file_name = data_file.stem.split("_")
-            df.attrs["date"] = split_file_name[0]
-            df.attrs["sensor_id"] = split_file_name[1]
+            return self.__geocoder
 
-            df.attrs["file_name"] = data_file.stem
-            dataframes.append(df)
+    # The lockdown info from the oxford government response tracker, which is downloaded the first time it is used.
+    @property
+    def lockdown_table(self):
+        return self.__load_lockdown_table()
 
-        logging.info(f"Loaded {len(dataframes)} csv files into dataframes")
-        return dataframes
+    # Return the lockdown table, loading it if it is not loaded yet.
+    def __load_lockdown_table(self):
+        with self.__lock:
+            if self.__lockdown_table is None:
+                from sensor_community_data.lockdown import LockdownTable
 
-    def start(self):
+                self.__lockdown_table = LockdownTable(refresh=self.refresh_lockdown_info)
+
+            return self.__lockdown_table
+
+    # Preprocess the current dataframes. If final is false, more data is expected in later calls, so the last resampling
+    # bucket of the combined city data is held back until it is finished by the next batch or by calling finish.
+    def start(self, final=True):
+        try:
+            self.__preprocess(final)
+        except BaseException:
+            self.__shutdown_executor()
+            raise
+
+        if final:
+            self.__shutdown_executor()
+
+    def __preprocess(self, final):
         self.__save_preprocessing_settings()
 
+        # Loading the lockdown table before the locations are processed, so it is loaded once and sent to the workers.
+        if self.add_lockdown_info:
+            self.__load_lockdown_table()
+
+        if self.out_of_core:
+            self.__start_out_of_core()
+            return
+
         # Grouping the dataframes by sensor id so the location is only found once per sensor.
         grouped_dataframes_sensor_id = self.__group_dataframes_by_attribute(self.dataframes, "sensor_id")
-        sensor_locations = self.__get_sensor_locations(grouped_dataframes_sensor_id)
-
-        Pool().map(self.__clean_dataframe, self.dataframes)
+        with self.metrics.span("geocode"):
+            sensor_locations = self.__get_sensor_locations(grouped_dataframes_sensor_id)
 
         grouped_dataframes_location = self.__group_dataframes_by_location(grouped_dataframes_sensor_id, sensor_locations)
+        locations = sorted(location for location in grouped_dataframes_location if location)
+
+        if self.incremental:
+            grouped_dataframes_location = self.__remove_completed_dataframes(grouped_dataframes_location)
+            locations = [location for location in locations if grouped_dataframes_location[location]]
+
+        # Including the locations that still have held back data when no more data is expected.
+        if final:
+            locations = sorted(set(locations) | set(self.resample_states))
+
+        # Each location is processed as a single task so the dataframes only cross the process boundary once.
+        results = self.__map("_process_location", locations,
+                             [grouped_dataframes_location.get(location, []) for location in locations],
+                             [self.manifest.get_last_timestamp(location) for location in locations],
+                             [self.__get_resample_state(location) for location in locations],
+                             [final] * len(locations))
+
+        self.__record_results(locations, results)
+
+    # Preprocessing the data folder one location at a time. The files are grouped by sensor and location using their
+    # file names, and the files from a location are only loaded by the task processing the location.
+    def __start_out_of_core(self):
+        grouped_files_sensor_id = collections.defaultdict(list)
+        for data_file in self.storage.find_files(self.data_folder, location_lookup=self.location_cache.get,
+                                                 **self.filters):
+            grouped_files_sensor_id[parse_data_file(data_file)[1]].append(data_file)
+
+        with self.metrics.span("geocode"):
+            sensor_locations = self.__get_file_sensor_locations(grouped_files_sensor_id)
+
+        grouped_files_location = self.__group_dataframes_by_location(grouped_files_sensor_id, sensor_locations)
+
+        if self.incremental:
+            grouped_files_location = {location: [data_file for data_file in data_files
+                                                 if not self.manifest.is_complete(
+                                                     f"{parse_data_file(data_file)[0]}/{location}")]
+                                      for location, data_files in grouped_files_location.items()}
+
+        locations = sorted(location for location, data_files in grouped_files_location.items()
+                           if location and data_files)
+        logging.info(f"Found {sum(len(grouped_files_location[location]) for location in locations)} files from "
+                     f"{len(locations)} locations")
+
+        results = self.__map("_process_location_files", locations,
+                             [grouped_files_location[location] for location in locations],
+                             [self.manifest.get_last_timestamp(location) for location in locations],
+                             [self.__get_resample_state(location) for location in locations])
+
+        self.__record_results(locations, results)
+
+    # Run the method of the preprocessor on each set of arguments in the executor. Worker processes received the
+    # preprocessor when they started, so only the method name and arguments are sent with each task.
+    def __map(self, method_name, *iterables):
+        if self.__executor is None:
+            if self.backend == "processes":
+                self.__executor = create_executor(self.backend, self.workers, initializer=_init_worker,
+                                                  initargs=(self,))
+            else:
+                self.__executor = create_executor(self.backend, self.workers)
 
-        for location, location_dataframes in grouped_dataframes_location.items():
-            if location:
-                logging.info(f"Processing data from {location}")
-                if self.add_lockdown_info:
-                    self.__add_lockdown_column(location, location_dataframes)
-
-                if self.combine_city_data:
-                    location_dataframes = self.__combine_city_dataframes(location, location_dataframes)
-
-                if self.resample_freq:
-                    location_dataframes = self.__resample_helper(location_dataframes)
+        if self.backend == "processes":
+            return self.__executor.map(_run_worker_task, [method_name] * len(iterables[0]), *iterables)
+        else:
+            return self.__executor.map(getattr(self, method_name), *iterables)
+
+    def __shutdown_executor(self):
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+
+    # Return the resampling state held back from the last batch of the location. If there is none, the state recorded
+    # in the manifest by an earlier run is returned, so the new buckets continue the saved buckets.
+    def __get_resample_state(self, location):
+        if location in self.resample_states:
+            return self.resample_states.pop(location)
+
+        return self.manifest.get_resample_state(location) if self.combine_city_data and self.resample_freq else None
+
+    # Recording the results of processing each location in the manifest and metrics. The results are merged in location
+    # order so the outcome does not depend on the task scheduling.
+    def __record_results(self, locations, results):
+        saved_rows = 0
+        for location, (units, last_timestamp, resample_state, metrics) in zip(locations, results):
+            self.metrics.merge(metrics)
+
+            # Recording the resampling state with the days, since the held back data of the days is only saved later.
+            if resample_state:
+                self.manifest.set_resample_state(location, resample_state)
+
+                if resample_state[1] is not None:
+                    self.resample_states[location] = resample_state
+
+            for date, (rows, content_hash) in units.items():
+                # Keeping the record of the first run if a day is preprocessed again since nothing is appended.
+                if not self.manifest.is_complete(f"{date}/{location}"):
+                    self.manifest.complete(f"{date}/{location}", rows, content_hash)
+                saved_rows += rows
+
+            if last_timestamp is not None:
+                self.manifest.set_last_timestamp(location, last_timestamp)
+
+        self.manifest.save()
+        self.metrics.increment("rows_saved", saved_rows)
+        logging.info(f"Saved {saved_rows} rows from {len(locations)} locations")
+
+        # Saving the potentially changed cache to persistent storage.
+        self.location_cache.save()
+
+    # Preprocess the data held back from the last resampling bucket, when no more data is expected. In incremental mode,
+    # the buckets that continue into the following day are kept for the next run.
+    def finish(self):
+        self.dataframes = []
+        self.start(final=True)
+
+    # Fully processing the data from a single location, returning the number of rows and a hash of the saved data for
+    # each day, the last timestamp written to the combined city file, the new resampling state and the metrics of the
+    # processing. Called in the workers.
+    def _process_location(self, location, location_dataframes, last_timestamp=None, resample_state=None, final=True):
+        logging.debug(f"Processing data from {location}")
+        metrics = Metrics()
+        dates = sorted({df.attrs["date"] for df in location_dataframes})
+
+        with metrics.span("clean"):
+            location_dataframes = [self._clean_dataframe(df) for df in location_dataframes]
 
-                self.__dataframes_to_csv(location, location_dataframes)
+        if self.combine_city_data:
+            with metrics.span("combine"):
+                location_dataframes = self.__combine_city_dataframes(location, location_dataframes)
 
-        # Saving the potentially changed caches to persistent storage.
-        with open("cache/location_cache.json", "w") as location_cachefile:
-            json.dump(self.location_cache, location_cachefile)
+        if self.add_lockdown_info:
+            with metrics.span("lockdown"):
+                self.__add_lockdown_column(location, location_dataframes)
+
+        if self.resample_freq and self.combine_city_data:
+            with metrics.span("resample"):
+                location_dataframes, resample_state = self.__resample_city_dataframes(location, location_dataframes,
+                                                                                       dates, resample_state, final)
+        elif self.resample_freq:
+            with metrics.span("resample"):
+                location_dataframes = self.__resample_helper(location_dataframes)
+
+        # Only appending data that is newer than the data already in the combined city file, so rerunning a day never
+        # duplicates rows.
+        if self.combine_city_data and last_timestamp is not None:
+            location_dataframes = [df[df["timestamp"] > last_timestamp] for df in location_dataframes]
+            location_dataframes = [df for df in location_dataframes if not df.empty]
+
+        with metrics.span("write"):
+            self.__save_dataframes(location, location_dataframes)
+
+        if self.combine_city_data and location_dataframes:
+            last_timestamp = max(df["timestamp"].max() for df in location_dataframes)
+
+        return self.__summarize_days(dates, location_dataframes), last_timestamp, resample_state, metrics
+
+    # Loading and processing the data files from a single location, one window of days at a time, with the resampling
+    # state carried from one window to the next. Returns the same results as processing the location at once. Called
+    # in the workers.
+    def _process_location_files(self, location, data_files, last_timestamp=None, resample_state=None):
+        dates = sorted({parse_data_file(data_file)[0] for data_file in data_files})
+        window_size = self.window_days or len(dates)
+        windows = [set(dates[i:i + window_size]) for i in range(0, len(dates), window_size)]
+
+        units = {}
+        metrics = Metrics()
+
+        for i, window in enumerate(windows):
+            with metrics.span("load"):
+                dataframes = [load_dataframe(self.storage, data_file, self.measurements) for data_file in data_files
+                              if parse_data_file(data_file)[0] in window]
+
+            window_units, last_timestamp, resample_state, window_metrics = self._process_location(
+                location, dataframes, last_timestamp, resample_state, final=i == len(windows) - 1)
+            metrics.merge(window_metrics)
+
+            # A day can be split between two windows when its last resampling bucket is held back to the next window.
+            units = self.__merge_units(units, window_units)
+
+        return units, last_timestamp, resample_state, metrics
+
+    # Return the number of rows and hash of the saved data from each day in two consecutive batches, combining the
+    # days that were saved in both batches.
+    @staticmethod
+    def __merge_units(units, new_units):
+        units = dict(units)
+        for date, (rows, content_hash) in new_units.items():
+            if date in units:
+                previous_rows, previous_hash = units[date]
+                content_hash = hashlib.sha256(f"{previous_hash}{content_hash}".encode()).hexdigest()
+                rows += previous_rows
+            units[date] = (rows, content_hash)
+
+        return units
+
+    # Return the number of rows and a hash of the saved data from each of the given days.
+    @staticmethod
+    def __summarize_days(dates, dataframes):
+        day_dataframes = collections.defaultdict(list)
+        for df in dataframes:
+            for date, day_df in df.groupby(df["timestamp"].dt.strftime("%Y-%m-%d")):
+                day_dataframes[date].append(day_df)
+
+        return {date: (sum(len(df) for df in day_dataframes[date]), hash_dataframes(day_dataframes[date]))
+                for date in sorted(set(dates) | set(day_dataframes))}
+
+    # Removing the dataframes from days that have already been preprocessed for their location.
+    def __remove_completed_dataframes(self, grouped_dataframes_location):
+        return {location: [df for df in location_dataframes
+                           if not self.manifest.is_complete(f"{df.attrs['date']}/{location}")]
+                for location, location_dataframes in grouped_dataframes_location.items()}
+
+    # Leaving out the data and caches when the preprocessor is sent to worker processes since they only need settings.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["dataframes"] = None
+        state["location_cache"] = None
+        state["_Preprocessor__geocoder"] = None
+        state["manifest"] = None
+        state["metrics"] = None
+        state["_Preprocessor__lock"] = None
+        state["_Preprocessor__executor"] = None
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
 
     # Creating a settings file specifying which settings are used for data preprocessing.
     def __save_preprocessing_settings(self):
@@ -128,50 +466,41 @@ class Preprocessor:
             settings = {
                 "combine_city_data": self.combine_city_data,
                 "resample_frequency": self.resample_freq,
-                "add_lockdown_info": self.add_lockdown_info
+                "add_lockdown_info": self.add_lockdown_info,
+                "storage_format": self.storage_format
             }
             json.dump(settings, jsonfile, default=str)
 
     # Return a dict with key-value pairs of the format "sensor_id-location".
     def __get_sensor_locations(self, grouped_dataframes_sensor_id):
-        sensor_locations = {}
+        sensor_coordinates = {}
         for sensor_id, sensor_id_dataframes in grouped_dataframes_sensor_id.items():
             df = sensor_id_dataframes[0]
+            sensor_coordinates[sensor_id] = (df["lat"].iloc[0], df["lon"].iloc[0])
 
-            lat = df["lat"].iloc[0]
-            lng = df["lon"].iloc[0]
-
-            location = self.__get_api_value(sensor_id, self.location_cache, lambda: self.__reverse_geocode(lat, lng))
-            logging.info(f"Simplified {sensor_id}, {lat}, {lng} to {location}")
-
-            sensor_locations[sensor_id] = location.replace("/", "-")
+        sensor_locations = self.geocoder.resolve(sensor_coordinates)
 
-        return sensor_locations
+        return {sensor_id: location.replace("/", "-") for sensor_id, location in sensor_locations.items()}
 
-    # Return a string with the format "city_country" based on the given latitude and longitude.
-    def __reverse_geocode(self, lat, lng):
-        logging.info(f"Reverse geocoding {lat}, {lng}")
-        maps_api_url = "https://maps.googleapis.com/maps/api/geocode/json?"
-        result_type = "&result_type=locality&result_type=political"
-        key = f"&key={self.api_key}"
+    # Return a dict with key-value pairs of the format "sensor_id-location", only reading the coordinates of the sensors
+    # from the files when the location or coordinates of a sensor are not in the location cache.
+    def __get_file_sensor_locations(self, grouped_files_sensor_id):
+        coordinates = self.location_cache.coordinates
 
-        # Making a request to the Google Maps reverse geocoding API.
-        api_response = requests.get(f"{maps_api_url}latlng={lat},{lng}{result_type}{key}").json()
-
-        try:
-            address_comp = api_response["results"][0]["address_components"]
+        sensor_coordinates = {}
+        for sensor_id, data_files in grouped_files_sensor_id.items():
+            if sensor_id in self.location_cache and sensor_id in coordinates:
+                sensor_coordinates[sensor_id] = coordinates[sensor_id]
+            else:
+                sensor_coordinates[sensor_id] = self.storage.read_coordinates(data_files[0])
 
-            # Extracting the city and country name by filtering on the address component type.
-            city = list(filter(lambda x: x["types"] == ["locality", "political"], address_comp))[0]["long_name"]
-            country = list(filter(lambda x: x["types"] == ["country", "political"], address_comp))[0]["long_name"]
+        sensor_locations = self.geocoder.resolve(sensor_coordinates)
 
-            return f"{city}_{country}"
-        except IndexError:
-            return ""
+        return {sensor_id: location.replace("/", "-") for sensor_id, location in sensor_locations.items()}
 
     # Doing preprocessing that should be applied to each dataframe individually.
-    def __clean_dataframe(self, df):
-        df["timestamp"] = pd.to_datetime(df["timestamp"], infer_datetime_format=True).dt.tz_localize(None)
+    def _clean_dataframe(self, df):
+        df["timestamp"] = parse_timestamps(df["timestamp"])
 
         # Removing location information from the data itself since it is now handled as metadata.
         del df["lat"]
@@ -179,46 +508,24 @@ class Preprocessor:
         del df["location"]
 
         if self.clean_data:
-            for measurement in [i for i in list(df) if i != "timestamp"]:
-                # Replacing data collected during New Years Eve if necessary.
-                # We consider 12/31-18:00 - 01/01/12:00 as New Years Eve.
-                if df.attrs["date"][-5:] == "12-31":
-                    hour_series = df["timestamp"].map(lambda x: x.hour)
-                    df.loc[hour_series >= 18, measurement] = (df.loc[hour_series < 18, measurement]).median()
-                elif df.attrs["date"][-5:] == "01-01":
-                    hour_series = df["timestamp"].map(lambda x: x.hour)
-                    df.loc[hour_series < 12, measurement] = (df.loc[hour_series >= 12, measurement]).median()
-
-                # Replacing outliers with the median using Z-score outlier detection.
-                median = df[measurement].median()
-                df.loc[np.abs(stats.zscore(df[measurement])) > 3, measurement] = median
-
-    # Checks if the country was locked down on the specific day and adds the result to a new column.
+            clean_measurements(df, df.attrs["date"])
+
+        return df
+
+    # Checks if the country was locked down when each row was collected and adds the result to a new column.
     def __add_lockdown_column(self, location, dataframes):
         country = location.split("_")[-1]
 
         for df in dataframes:
-            try:
-                date = df.attrs["date"]
-                lockdown = 0
-
-                # 2020-01-01 was the first day with any restrictions so no reason to check if date is before that.
-                if date >= "2020-01-01":
-                    formatted_date = f"{date[-2:]}{calendar.month_abbr[int(date[-5:-3])]}{date[:4]}"
-                    alpha_3_code = pycountry.countries.lookup(country).alpha_3
-
-                    # The current threshold for what is considered a "lockdown" (any stay at home requirements).
-                    if self.lockdown_df[self.lockdown_df["country_code"] == alpha_3_code][formatted_date].iloc[0] > 0:
-                        lockdown = 1
-
-                df["lockdown"] = lockdown
-            except (IndexError, AttributeError, KeyError):
-                df["lockdown"] = 0
+            df["lockdown"] = self.lockdown_table.lookup(country, df["timestamp"])
 
     @staticmethod
     def __combine_city_dataframes(location, city_dataframes):
-        df = pd.concat(city_dataframes, ignore_index=True)
-        df.sort_values("timestamp", inplace=True)
+        if not city_dataframes:
+            return []
+
+        # The data from each sensor is already sorted, so the sensor series are merged instead of sorted from scratch.
+        df = merge_sorted(city_dataframes)
 
         df.attrs["file_name"] = location
 
@@ -233,49 +540,54 @@ class Preprocessor:
 
             df = df.resample(self.resample_freq, on="timestamp").mean()
             df.reset_index(level=0, inplace=True)
-
-            # Handle problems introduced by resampling such as missing values and unnecessary type casting.
             df = df.fillna(df.median(numeric_only=True))
-            if self.add_lockdown_info:
-                df["lockdown"] = df["lockdown"].astype(int)
 
-            # Rounding since resampling with mean results in too many decimals for the measurements.
-            df = df.round(2)
-
-            df.attrs["file_name"] = file_name
-            resampled_dataframes.append(df)
+            resampled_dataframes.append(self.__clean_resampled_dataframe(df, file_name))
 
         return resampled_dataframes
 
-    # Writing each dataframe to the final folder structure.
-    def __dataframes_to_csv(self, location, dataframes):
-        if self.combine_city_data:
-            path = Path(f"{self.save_path}")
+    # Resampling the combined city data with the state carried over from the previous batch, so buckets that cross
+    # the boundary between batches are the same as when resampling the full range at once. When the series is
+    # finished, the returned state only holds the origin of the buckets.
+    def __resample_city_dataframes(self, location, dataframes, dates, resample_state, final):
+        # Replacing the held back rows from days in the batch, so a day that is preprocessed again is not counted twice.
+        if resample_state and resample_state[1] is not None:
+            origin, carry_over, last_bucket = resample_state
+            carry_over_days = carry_over["timestamp"].dt.strftime("%Y-%m-%d")
+            resample_state = (origin, carry_over[~carry_over_days.isin(dates)], last_bucket)
+
+        if dataframes:
+            df = dataframes[0]
+        elif resample_state and resample_state[1] is not None:
+            df = resample_state[1].iloc[:0]
         else:
-            path = Path(f"{self.save_path}/{location}/")
-            path.mkdir(parents=True, exist_ok=True)
+            return [], resample_state
 
-        for df in dataframes:
-            file_path = f"{path.as_posix()}/{df.attrs['file_name']}.csv"
+        df, resample_state = StreamingResampler(self.resample_freq).resample(df, resample_state, final,
+                                                                             continued=self.incremental)
 
-            # Appending to the data if the file already exists.
-            if not os.path.isfile(file_path):
-                df.to_csv(file_path, index=False, header="column_names")
-            else:
-                df.to_csv(file_path, mode="a", index=False, header=False)
-        logging.info(f"Saved data from {location} to persistent storage")
+        if df.empty:
+            return [], resample_state
 
-    # Tries to retrieve value from cache, if not possible then retrieves it with the given callable api_func.
-    @staticmethod
-    def __get_api_value(key, cache, api_func):
-        if key in cache:
-            value = cache[key]
-        else:
-            value = api_func()
-            # Saving the newly retrieved value in the cache.
-            cache[key] = value
+        return [self.__clean_resampled_dataframe(df, location)], resample_state
 
-        return value
+    # Handle problems introduced by resampling such as unnecessary type casting.
+    def __clean_resampled_dataframe(self, df, file_name):
+        if self.add_lockdown_info:
+            df["lockdown"] = df["lockdown"].astype(int)
+
+        # Rounding since resampling with mean results in too many decimals for the measurements.
+        df = df.round(2)
+
+        df.attrs["file_name"] = file_name
+        return df
+
+    # Writing each dataframe to the final folder structure, appending to the combined city file if it already exists.
+    def __save_dataframes(self, location, dataframes):
+        for df in dataframes:
+            self.storage.write_processed(df, self.save_path, location, self.combine_city_data)
+
+        logging.debug(f"Saved data from {location} to persistent storage")
 
     @staticmethod
     def __group_dataframes_by_attribute(dataframes, attribute):
@@ -294,3 +606,12 @@ class Preprocessor:
             grouped_dataframes_location[sensor_locations[sensor_id]].extend(sensor_id_dataframes)
 
         return grouped_dataframes_location
+
+
+def _init_worker(preprocessor):
+    global _worker_preprocessor
+    _worker_preprocessor = preprocessor
+
+
+def _run_worker_task(method_name, *args):
+    return getattr(_worker_preprocessor, method_name)(*args)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+
+class StreamingResampler:
+    """
+    Class resampling a time series that arrives in consecutive batches, such as one day at a time, with the same
+    buckets as when resampling the full range at once. The rows in the last bucket of a batch are carried over to the
+    next batch since the bucket can continue in the next batch, so only finished buckets are emitted and at most one
+    bucket per series is kept in memory between batches.
+
+    Empty buckets are filled with the last value before them. The last emitted bucket is carried over with the rows of
+    the last bucket, so the empty buckets between batches are added and the filled values do not depend on where the
+    batches end. Columns without any value since the start of the series are left empty.
+
+    The carry-over state is returned to the caller instead of being kept in the resampler, so a state can be sent to
+    worker processes together with the data it belongs to.
+
+    Parameters
+    ----------
+    freq : str
+        The offset string representing the target conversion.
+    """
+    def __init__(self, freq):
+        self.freq = freq
+
+    # Return the mean of each finished bucket in the batch and the state that should be given with the next batch. If
+    # final is true, the last bucket is emitted as well, unless continued is true and the bucket continues into the day
+    # after the last row, where a later run can still add rows to it, in which case it is kept in the state.
+    def resample(self, df, state=None, final=False, continued=False):
+        origin, carry_over, last_bucket = state if state else (df["timestamp"].min().normalize(), None, None)
+
+        if carry_over is not None:
+            df = merge_sorted([carry_over, df])
+
+        if df.empty:
+            return df, (origin, None, last_bucket)
+
+        grouper = pd.Grouper(key="timestamp", freq=self.freq, origin=origin)
+        resampled_df = df.groupby(grouper).mean()
+
+        if final and continued:
+            final = not self.__continues_into_next_day(df["timestamp"].max(), origin)
+
+        if final:
+            carry_over = None
+        else:
+            # The last bucket is carried over to the next batch since it may be continued by the next batch.
+            buckets = df.groupby(grouper).ngroup().to_numpy()
+            carry_over = df[buckets == buckets.max()]
+            resampled_df = resampled_df.iloc[:-1]
+
+        resampled_df, last_bucket = self.__fill_empty_buckets(resampled_df, last_bucket)
+        resampled_df.reset_index(level=0, inplace=True)
+
+        return resampled_df, (origin, carry_over, last_bucket)
+
+    # Return the buckets with the empty buckets filled with the last value before them and the last bucket, as a dict
+    # from the columns to the timestamp and values of the bucket. The buckets following the last bucket of the previous
+    # batch are added first, since a batch that starts after a gap, such as the first batch of a later run, only
+    # starts with the bucket of its first row.
+    def __fill_empty_buckets(self, df, last_bucket):
+        if last_bucket:
+            previous_df = pd.DataFrame([last_bucket]).set_index("timestamp").reindex(columns=df.columns)
+            df = df[df.index > previous_df.index[0]]
+
+        if df.empty:
+            return df, last_bucket
+
+        if last_bucket:
+            dtypes = df.dtypes
+            df = pd.concat([previous_df, df]).asfreq(self.freq).ffill().iloc[1:].astype(dtypes)
+        else:
+            df = df.ffill()
+
+        return df, {"timestamp": df.index[-1], **df.iloc[-1].dropna().astype(float).to_dict()}
+
+    # Return true if the bucket of the timestamp also contains the start of the following day.
+    def __continues_into_next_day(self, timestamp, origin):
+        timestamps = pd.DataFrame({"timestamp": [timestamp, timestamp.normalize() + pd.Timedelta(days=1)]})
+        buckets = timestamps.groupby(pd.Grouper(key="timestamp", freq=self.freq, origin=origin)).ngroup()
+
+        return buckets.iloc[0] == buckets.iloc[1]
+
+
+# Return the dataframes merged into a single dataframe sorted by timestamp. Since the data from each sensor is already
+# sorted, the stable sort only has to merge the sorted runs instead of sorting from scratch.
+def merge_sorted(dataframes):
+    df = pd.concat(dataframes, ignore_index=True)
+    order = np.argsort(df["timestamp"].to_numpy(), kind="stable")
+
+    return df.take(order).reset_index(drop=True)
@@ -0,0 +1,218 @@
+import json
+import logging
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sensor_community_data.cleaning import parse_timestamps
+from sensor_community_data.storage import create_storage, parse_file_name
+
+# Aggregates stored for each bucket, from which the mean is derived.
+aggregates = ["count", "sum", "min", "max"]
+
+
+class RollupStore:
+    """
+    Store of pre-aggregated measurements built from the output of the preprocessor. The count, sum, minimum and maximum
+    of each measurement are stored per city, and per sensor if the data from each sensor was saved separately, in time
+    buckets at multiple resolutions. Queries are answered from the coarsest stored resolution that fits the requested
+    resolution and range, so a query never has to read the preprocessed data. The store is an SQLite database.
+
+    Building the store is incremental: the number of rows read from each output file is recorded, so only rows that
+    were appended to a file since the last build are added. Use ``rebuild=True`` if the output was replaced.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite database.
+    resolutions : list of str, optional
+        The resolutions of the stored buckets as fixed offset strings. Buckets are aligned to midnight (the default is
+        ["10T", "60T", "1D"]).
+    """
+    def __init__(self, path, resolutions=("10T", "60T", "1D")):
+        self.path = Path(path)
+        self.levels = sorted(_to_seconds(resolution) for resolution in resolutions)
+
+    # Adding the rows in the preprocessed output folder that have not been added yet. The measurements default to all
+    # numeric columns except the lockdown column.
+    def build(self, save_path, measurements=None, rebuild=False):
+        # Resolving the path, so the files are recorded under the same name however the save path is written.
+        save_path = Path(save_path).resolve()
+        with open(save_path.joinpath("settings.json"), "r") as settingsfile:
+            settings = json.load(settingsfile)
+
+        storage = create_storage(settings.get("storage_format", "csv"))
+        combined = settings["combine_city_data"]
+
+        with closing(self.__connect()) as connection:
+            stored_levels = {row[0] for row in connection.execute("SELECT level FROM levels")}
+
+            # Changing the resolutions of an existing store would leave the new resolutions without the earlier data.
+            if stored_levels and stored_levels != set(self.levels) and not rebuild:
+                raise ValueError(f"The rollup store {self.path} has the resolutions {sorted(stored_levels)} seconds, "
+                                 f"use rebuild=True to change them")
+
+            with connection:
+                if rebuild:
+                    connection.execute("DELETE FROM rollups")
+                    connection.execute("DELETE FROM sources")
+                    connection.execute("DELETE FROM levels")
+
+                connection.executemany("INSERT OR IGNORE INTO levels (level) VALUES (?)",
+                                       [(level,) for level in self.levels])
+
+            added_rows = 0
+            for data_file in sorted(save_path.rglob(f"*.{storage.extension}")):
+                location, sensor_id = self.__get_file_source(save_path, data_file, combined)
+                added_rows += self.__add_file(connection, storage, data_file, location, sensor_id, measurements)
+
+        logging.info(f"Added {added_rows} rows from {save_path} to the rollup store {self.path}")
+
+    # Return the aggregates of the measurement from the city, or from the sensor if a sensor id is given, in buckets of
+    # the given resolution starting at midnight, for the buckets starting in the range from start to end.
+    def query(self, location, measurement, start, end, resolution="60T", sensor_id=None):
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        resolution_seconds = _to_seconds(resolution)
+        start_seconds, end_seconds = _to_epoch_seconds(start), _to_epoch_seconds(end)
+
+        with closing(self.__connect()) as connection:
+            level = self.__choose_level(connection, resolution, start, end)
+
+            rows = connection.execute(
+                "SELECT bucket / ? * ? AS resolution_bucket, SUM(count), SUM(sum), MIN(min), MAX(max) FROM rollups "
+                "WHERE level = ? AND scope = ? AND key = ? AND measurement = ? AND bucket >= ? AND bucket < ? "
+                "GROUP BY resolution_bucket ORDER BY resolution_bucket",
+                (resolution_seconds, resolution_seconds, level, "sensor" if sensor_id else "city",
+                 str(sensor_id) if sensor_id else location, measurement, start_seconds, end_seconds)).fetchall()
+
+        df = pd.DataFrame(rows, columns=["timestamp"] + aggregates)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s")
+        df["mean"] = df["sum"] / df["count"]
+
+        return df
+
+    # Return the locations in the store.
+    def locations(self):
+        with closing(self.__connect()) as connection:
+            rows = connection.execute("SELECT DISTINCT key FROM rollups WHERE scope = 'city' ORDER BY key").fetchall()
+
+        return [row[0] for row in rows]
+
+    # Return the coarsest stored level that evenly divides the resolution and that the range is aligned to, so the
+    # buckets of the level never cross the boundaries of the requested buckets or range.
+    @staticmethod
+    def __choose_level(connection, resolution, start, end):
+        resolution_seconds = _to_seconds(resolution)
+        start_seconds, end_seconds = _to_epoch_seconds(start), _to_epoch_seconds(end)
+
+        levels = [row[0] for row in connection.execute("SELECT level FROM levels ORDER BY level DESC")]
+        if not levels:
+            raise ValueError("The rollup store is empty, build it from the preprocessed data first")
+
+        for level in levels:
+            if resolution_seconds % level == 0 and start_seconds % level == 0 and end_seconds % level == 0:
+                return level
+
+        raise ValueError(f"No stored resolution fits buckets of '{resolution}' from {start} to {end}, the stored "
+                         f"resolutions are {levels} seconds")
+
+    # Return the location and sensor id of the data in the file, where the sensor id is None for combined city data.
+    @staticmethod
+    def __get_file_source(save_path, data_file, combined):
+        file_name = data_file.name.split(".")[0]
+        partitions = dict(part.split("=", 1) for part in data_file.relative_to(save_path).parts if "=" in part)
+
+        if combined:
+            return partitions.get("location", file_name), None
+        else:
+            return partitions.get("location", data_file.parent.name), parse_file_name(file_name)[1]
+
+    # Adding the rows in the file that have not been added yet to the store, returning the number of added rows.
+    def __add_file(self, connection, storage, data_file, location, sensor_id, measurements):
+        source = str(data_file)
+        row = connection.execute("SELECT rows FROM sources WHERE source = ?", (source,)).fetchone()
+        added_rows = row[0] if row else 0
+
+        df = storage.read(data_file).iloc[added_rows:]
+        if df.empty:
+            return 0
+
+        if measurements is None:
+            measurements = [column for column in df.columns if column not in ["timestamp", "lockdown"]
+                            and pd.api.types.is_numeric_dtype(df[column])]
+
+        seconds = _to_epoch_seconds(parse_timestamps(df["timestamp"]))
+        scopes = [("city", location)] + ([("sensor", sensor_id)] if sensor_id else [])
+
+        # Adding the buckets and recording the rows as added in a single transaction, so an interrupted build never
+        # adds the same rows twice.
+        with connection:
+            for level in self.levels:
+                buckets = self.__aggregate(df[measurements].astype(np.float64), seconds // level * level)
+
+                for scope, key in scopes:
+                    connection.executemany(
+                        "INSERT INTO rollups (level, scope, key, measurement, bucket, count, sum, min, max) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (level, scope, key, measurement, bucket) DO UPDATE SET "
+                        "count = count + excluded.count, sum = sum + excluded.sum, "
+                        "min = MIN(min, excluded.min), max = MAX(max, excluded.max)",
+                        [(level, scope, key, *bucket) for bucket in buckets])
+
+            connection.execute("INSERT OR REPLACE INTO sources (source, rows) VALUES (?, ?)",
+                               (source, added_rows + len(df)))
+
+        return len(df)
+
+    # Return a list of (measurement, bucket, count, sum, min, max) tuples for the non-empty buckets of each measurement.
+    @staticmethod
+    def __aggregate(df, buckets):
+        grouped = df.groupby(buckets).agg(aggregates)
+
+        rows = []
+        for measurement in df.columns:
+            measurement_df = grouped[measurement]
+            measurement_df = measurement_df[measurement_df["count"] > 0]
+
+            rows += zip([measurement] * len(measurement_df), measurement_df.index.tolist(),
+                        measurement_df["count"].tolist(), measurement_df["sum"].tolist(),
+                        measurement_df["min"].tolist(), measurement_df["max"].tolist())
+
+        return rows
+
+    def __connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=60)
+
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS rollups (level INTEGER, scope TEXT, key TEXT, "
+                               "measurement TEXT, bucket INTEGER, count INTEGER, sum REAL, min REAL, max REAL, "
+                               "PRIMARY KEY (level, scope, key, measurement, bucket)) WITHOUT ROWID")
+            connection.execute("CREATE TABLE IF NOT EXISTS levels (level INTEGER PRIMARY KEY)")
+            connection.execute("CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, rows INTEGER)")
+
+        return connection
+
+
+# Return the length of a fixed resolution, such as "10T" or "1D", in seconds.
+def _to_seconds(resolution):
+    try:
+        seconds = pd.Timedelta(pd.tseries.frequencies.to_offset(resolution)).total_seconds()
+    except ValueError:
+        raise ValueError(f"The resolution '{resolution}' does not have a fixed length")
+
+    if seconds < 1 or seconds % 1:
+        raise ValueError(f"The resolution '{resolution}' is not a whole number of seconds")
+
+    return int(seconds)
+
+
+# Return the timestamps as whole seconds since the epoch, so buckets of whole days start at midnight.
+def _to_epoch_seconds(timestamps):
+    if isinstance(timestamps, pd.Timestamp):
+        return timestamps.value // 10 ** 9
+
+    return timestamps.to_numpy().astype("datetime64[s]").astype(np.int64)
@@ -1,13 +1,20 @@
+import io
 import json
 import logging
+import queue
+import threading
 from datetime import date, timedelta
-from multiprocessing.dummy import Pool
 from pathlib import Path
-from itertools import chain
 
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+from sensor_community_data.checkpoint import Manifest, hash_dataframes
+from sensor_community_data.downloader import Downloader
+from sensor_community_data.file_filter import FileFilter
+from sensor_community_data.ingestion import CsvReader
+from sensor_community_data.listing import ListingCache, extract_hrefs
+from sensor_community_data.location_cache import LocationCache
+from sensor_community_data.metrics import Metrics, ProgressReporter
+from sensor_community_data.mirror import Mirror
+from sensor_community_data.storage import create_storage
 
 
 class Scraper:
@@ -17,14 +24,30 @@ class Scraper:
 
     Attributes
     ----------
-    location_cache : dict
-        Dictionary from sensor ids to the city and country connected to the id. The cache is loaded from persistent
-        storage on initialization.
+    location_cache : :class:`LocationCache`
+        Cache from sensor ids to the city and country connected to the id. The cache is shared with the preprocessor
+        and loaded from persistent storage when first used.
     columns : list of str
         Columns that should be kept when retrieving the CSV data. This includes common columns and the wanted
         measurements.
     url : str
         The url of the archive website.
+    downloader : :class:`Downloader`
+        The downloader used for all requests to the archive, sharing connections between requests.
+    mirror : :class:`Mirror` or None
+        The local mirror that archive files are served from when possible, if a mirror path was given.
+    manifest : :class:`Manifest` or None
+        The checkpoint manifest recording which days have been scraped. The manifest of the preprocessor is used if a
+        preprocessor is given, and otherwise a manifest in the save path is used.
+    listing_cache : :class:`ListingCache` or None
+        The cache of the index pages of past days, if a listing cache path was given.
+    csv_reader : :class:`CsvReader`
+        The reader loading the downloaded files into dataframes with compact types.
+    metrics : :class:`Metrics`
+        The timing spans and counters of the scrape. The metrics of the preprocessor are used if a preprocessor is
+        given, so the metrics of both are collected in one place.
+    progress : :class:`ProgressReporter`
+        The reporter logging the number of scraped days, files, rows and bytes while scraping.
 
     Parameters
     ----------
@@ -47,14 +70,56 @@ class Scraper:
         The path to where the scraped data should be saved (the default is None, meaning the data is not saved).
     preprocessor : :class:`Preprocessor`, optional
         The preprocessor to pipe the data into (the default is None, meaning the data is not piped anywhere).
+    archive_url : str, optional
+        The url of the archive to scrape from (the default is "https://archive.sensor.community/").
+    max_connections : int, optional
+        The maximum number of concurrent requests to the archive (the default is 16).
+    max_retries : int, optional
+        The number of times a failed request is retried before giving up (the default is 5).
+    requests_per_second : float, optional
+        The maximum number of requests per second sent to the archive (the default is None, meaning no limit).
+    prefetch_days : int, optional
+        The number of downloaded days that can wait for the preprocessor while the next day is downloaded. Downloading
+        and preprocessing overlap when this is at least 1, and 0 means each day is preprocessed before the next day is
+        downloaded (the default is 1).
+    mirror_path : str, optional
+        The path to a local mirror of the archive. Files already in the mirror are read from disk and downloaded
+        files are added to the mirror (the default is None, meaning all files are downloaded from the archive).
+    mirror_compression : {"gzip", "zstd"}, optional
+        The compression used for files in the mirror (the default is "gzip").
+    revalidate_mirror : bool, optional
+        If true, files in the mirror are checked against the archive with a conditional request and downloaded again
+        if they have changed (the default is False).
+    storage_format : {"csv", "parquet"}, optional
+        The format the scraped data is saved in. The parquet format requires the pyarrow package and partitions the
+        data by date, location and sensor type (the default is "csv").
+    resume : bool, optional
+        If true, days that have already been scraped according to the checkpoint manifest are skipped, allowing an
+        interrupted run to be resumed (the default is False).
+    listing_cache_path : str, optional
+        The path to the cache of the links on the index pages of the archive. Days at least two days old are complete
+        in the archive, so their links are only retrieved once (the default is "cache/listing_cache.sqlite", and None
+        means the index pages are always retrieved from the archive).
+    csv_engine : {"c", "pyarrow"}, optional
+        The parser engine used to read the downloaded files. "pyarrow" requires the pyarrow package (the default is
+        "c").
+    chunksize : int, optional
+        The number of rows parsed at a time when reading a downloaded file, which bounds the memory used to parse very
+        large files. Not supported by the pyarrow engine (the default is None, meaning each file is parsed at once).
+    progress_interval : float, optional
+        The minimum number of seconds between two progress reports (the default is 10).
     """
     def __init__(self, measurements, sensor_type, start_date=date(2015, 10, 1), end_date=date.today() - timedelta(1),
-                 location=None, sensor_ids=None, remove_indoor=True, save_path=None, preprocessor=None):
-        with open("cache/location_cache.json", "r") as location_cachefile:
-            self.location_cache = json.load(location_cachefile)
+                 location=None, sensor_ids=None, remove_indoor=True, save_path=None, preprocessor=None,
+                 archive_url="https://archive.sensor.community/", max_connections=16, max_retries=5,
+                 requests_per_second=None, prefetch_days=1, mirror_path=None, mirror_compression="gzip",
+                 revalidate_mirror=False, storage_format="csv", resume=False,
+                 listing_cache_path="cache/listing_cache.sqlite", csv_engine="c", chunksize=None,
+                 progress_interval=10):
+        self.location_cache = LocationCache.get_instance()
 
         self.columns = ["location", "lat", "lon", "timestamp"] + measurements
-        self.url = "https://archive.sensor.community/"
+        self.url = archive_url if archive_url.endswith("/") else f"{archive_url}/"
         self.sensor_type = sensor_type
 
         self.start_date = start_date
@@ -64,29 +129,150 @@ class Scraper:
         self.remove_indoor = remove_indoor
         self.save_path = save_path
         self.preprocessor = preprocessor
+        self.prefetch_days = prefetch_days
+        self.storage_format = storage_format
+        self.storage = create_storage(storage_format)
+        self.resume = resume
+        # The sensors in the location are looked up once, so the location cache is not read again for every day.
+        location_sensor_ids = self.location_cache.sensor_ids(location) if location else None
+        self.file_filter = FileFilter(sensor_type, sensor_ids, remove_indoor, location_sensor_ids)
+        self.csv_reader = CsvReader(measurements, engine=csv_engine, chunksize=chunksize)
+
+        if preprocessor:
+            self.manifest = preprocessor.manifest
+        elif save_path:
+            self.manifest = Manifest(save_path)
+        else:
+            self.manifest = None
+
+        self.metrics = preprocessor.metrics if preprocessor else Metrics()
+        self.progress = ProgressReporter(self.metrics, ["days", "files", "rows", "bytes"], interval=progress_interval)
+
+        self.downloader = Downloader(max_connections=max_connections, max_retries=max_retries,
+                                     requests_per_second=requests_per_second)
+
+        if mirror_path:
+            self.mirror = Mirror(mirror_path, compression=mirror_compression, revalidate=revalidate_mirror)
+        else:
+            self.mirror = None
+
+        self.listing_cache = ListingCache(listing_cache_path) if listing_cache_path else None
 
     def start(self):
+        with self.metrics.span("scrape"):
+            self.__scrape()
+
+        self.progress.report(force=True)
+
+    def __scrape(self):
         if self.save_path:
             self.__save_scrape_settings()
 
         # Retrieving the urls containing the wanted data in the online archive.
         date_urls = self.get_date_urls()
-        daily_file_urls = Pool().map(self.get_file_urls, date_urls)
+
+        if self.resume and self.manifest:
+            date_urls = [date_url for date_url in date_urls
+                         if not self.manifest.is_complete(f"day/{date_url[len(self.url):]}")]
+            logging.info(f"Resuming with {len(date_urls)} remaining days")
+
+        daily_file_urls = self.downloader.map(self.get_file_urls, date_urls)
+        days = [(date_url[len(self.url):], file_urls) for date_url, file_urls in zip(date_urls, daily_file_urls)]
+
+        self.progress.totals["days"] = len(days)
+        self.progress.totals["files"] = sum(len(file_urls) for _, file_urls in days)
 
         # If a preprocessor is given, pipe the data directly into the preprocessor daily.
         if self.preprocessor:
-            for file_urls in daily_file_urls:
-                dataframes = Pool().map(lambda file_url: self.__process_file(file_url), file_urls)
-                dataframes = [df for df in dataframes if not df.empty]
+            for day, dataframes in self.__download_days(days):
+                # Summarizing the day before preprocessing since the preprocessor modifies the dataframes.
+                rows, content_hash = sum(len(df) for df in dataframes), hash_dataframes(dataframes)
 
                 self.preprocessor.dataframes = dataframes
-                self.preprocessor.start()
-        # If not, then scrape all the data concurrently.
-        else:
-            # Flattening the list of lists.
-            file_urls = list(chain.from_iterable(daily_file_urls))
+                self.preprocessor.start(final=False)
+                self.__complete_day(day, rows, content_hash)
 
-            Pool().map(lambda file_url: self.__process_file(file_url), file_urls)
+            # Preprocessing the data that was held back since it could be continued by the following day.
+            self.preprocessor.finish()
+        # If not, then scrape the data one day at a time so the finished days can be recorded in the manifest.
+        else:
+            for day, file_urls in days:
+                dataframes = self.__download_day(file_urls)
+                self.__complete_day(day, sum(len(df) for df in dataframes), hash_dataframes(dataframes))
+
+        if self.mirror:
+            self.mirror.save_index()
+
+    # Recording the day as done in the manifest, which is saved immediately so the progress survives an interruption.
+    def __complete_day(self, day, rows, content_hash):
+        self.metrics.increment("days")
+
+        if self.manifest:
+            self.manifest.complete(f"day/{day}", rows, content_hash)
+            self.manifest.save()
+
+    # Yield the date and dataframes of each day. If prefetching is enabled, the following days are downloaded in a
+    # background thread while the current day is preprocessed, with the bounded queue keeping the number of days in
+    # memory bounded.
+    def __download_days(self, days):
+        if not self.prefetch_days:
+            for day, file_urls in days:
+                yield day, self.__download_day(file_urls)
+            return
+
+        day_queue = queue.Queue(maxsize=self.prefetch_days)
+        stop_event = threading.Event()
+
+        def producer():
+            try:
+                for day, file_urls in days:
+                    dataframes = self.__download_day(file_urls)
+                    if not self.__put_unless_stopped(day_queue, ((day, dataframes), None), stop_event):
+                        return
+            except Exception as e:
+                self.__put_unless_stopped(day_queue, (None, e), stop_event)
+            finally:
+                self.__put_unless_stopped(day_queue, None, stop_event)
+
+        producer_thread = threading.Thread(target=producer, daemon=True)
+        producer_thread.start()
+
+        try:
+            while True:
+                item = day_queue.get()
+                if item is None:
+                    break
+
+                downloaded_day, error = item
+                if error:
+                    raise error
+
+                yield downloaded_day
+        finally:
+            # Letting the producer exit if the consumer stopped early, for example because preprocessing failed.
+            stop_event.set()
+            producer_thread.join()
+
+    def __download_day(self, file_urls):
+        dataframes = self.downloader.map(self.__process_file, file_urls)
+
+        # Saving the mirror index after each day so the mirrored files are kept if the run is interrupted.
+        if self.mirror:
+            self.mirror.save_index()
+
+        return [df for df in dataframes if not df.empty]
+
+    # Put the item in the queue, giving up if the stop event is set while waiting for space in the queue.
+    @staticmethod
+    def __put_unless_stopped(day_queue, item, stop_event):
+        while not stop_event.is_set():
+            try:
+                day_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+
+        return False
 
     # Creating a settings file specifying which settings are used for data retrieval.
     def __save_scrape_settings(self):
@@ -96,6 +282,16 @@ class Scraper:
         with open(path.joinpath("settings.json"), "w+") as jsonfile:
             settings = self.__dict__.copy()
             del settings["url"]
+            del settings["location_cache"]
+            del settings["downloader"]
+            del settings["mirror"]
+            del settings["storage"]
+            del settings["manifest"]
+            del settings["file_filter"]
+            del settings["listing_cache"]
+            del settings["csv_reader"]
+            del settings["metrics"]
+            del settings["progress"]
 
             json.dump(settings, jsonfile, default=str)
 
@@ -107,38 +303,38 @@ class Scraper:
 
     # Return a list of the files that should be scraped, gathered from the data url.
     def get_file_urls(self, date_url):
-        logging.info(f"Retrieving file urls from {date_url}")
-        date_html = requests.get(date_url).text
-        soup = BeautifulSoup(date_html, features="html.parser")
+        with self.metrics.span("listing"):
+            hrefs = self.__get_hrefs(date_url)
+            file_urls = [f"{date_url}/{href}" for href in hrefs]
 
-        file_urls = ([f"{date_url}/{a['href']}" for a in soup.find_all('a', href=True)])
-        file_urls = self.__remove_unwanted_files(file_urls)
-        logging.info(f"Retrieved {len(file_urls)} file urls")
+            # Removing urls that do not link to a CSV file from the wanted sensors, in a single pass over the urls.
+            file_urls = self.file_filter.filter(file_urls)
+
+        logging.debug(f"Retrieved {len(file_urls)} file urls from {date_url}")
+        self.metrics.increment("files_listed", len(file_urls))
 
         return file_urls
 
-    def __remove_unwanted_files(self, file_urls):
-        # Removing urls that do not link to a CSV file.
-        file_urls = list(filter(lambda file_url: file_url.endswith(".csv"), file_urls))
+    # Return the hrefs on the index page of the day, using the listing cache for days that can no longer change.
+    def __get_hrefs(self, date_url):
+        is_complete = date.fromisoformat(date_url[len(self.url):]) < date.today() - timedelta(1)
 
-        # Removing urls that does not use a sensor id from the specified location, if a location was specified.
-        if self.location:
-            location_sensor_ids = [k for k, v in self.location_cache.items() if v == self.location]
-            file_urls = list(filter(lambda file_url: file_url.split("_")[3].replace(".csv", "") in location_sensor_ids, file_urls))
+        if self.listing_cache and is_complete:
+            hrefs = self.listing_cache.get(date_url)
+            if hrefs is not None:
+                logging.debug(f"Using cached file urls from {date_url}")
+                self.metrics.increment("listing_cache_hits")
+                return hrefs
 
-        # Removing urls that does not use one of the specified sensor types, if any were specified.
-        if self.sensor_type:
-            file_urls = list(filter(lambda file_url: self.sensor_type in file_url, file_urls))
+            self.metrics.increment("listing_cache_misses")
 
-        # Doing the same as above but for sensor ids.
-        if self.sensor_ids:
-            file_urls = list(filter(lambda file_url: any(sensor_id == int(file_url.split("_")[3].replace(".csv", ""))
-                                                         for sensor_id in self.sensor_ids), file_urls))
+        logging.debug(f"Retrieving file urls from {date_url}")
+        hrefs = extract_hrefs(self.downloader.get_text(date_url))
 
-        if self.remove_indoor:
-            file_urls = list(filter(lambda file_url: "indoor" not in file_url, file_urls))
+        if self.listing_cache and is_complete:
+            self.listing_cache.set(date_url, hrefs)
 
-        return file_urls
+        return hrefs
 
     # Fully processing a single file, which involves downloading it, modifying it slightly and saving it locally.
     def __process_file(self, file_url):
@@ -147,17 +343,30 @@ class Scraper:
 
         # The dataframe will be empty if at least one value was missing in each row.
         if not df.empty and self.save_path:
-            self.__to_csv_helper(df)
+            self.__save_helper(df)
+
+        self.metrics.increment("files")
+        self.metrics.increment("rows", len(df))
+        self.progress.report()
 
         return df
 
     def __read_csv_helper(self, file_url):
-        logging.info(f"Converting {file_url} to a dataframe")
+        logging.debug(f"Converting {file_url} to a dataframe")
+
+        with self.metrics.span("download"):
+            if self.mirror:
+                content = self.mirror.fetch(self.downloader, file_url, file_url[len(self.url):])
+            else:
+                content = self.downloader.get_content(file_url)
+
+        self.metrics.increment("bytes", len(content))
 
-        df = pd.read_csv(file_url, sep=";", usecols=self.columns)
+        with self.metrics.span("parse"):
+            df = self.csv_reader.read(io.BytesIO(content))
 
-        # Removing the website and ".csv" from the url with list slicing to get the file name only.
-        split_file_name = file_url[44:-4].split("_")
+        # Removing the website and ".csv" from the url to get the file name only.
+        split_file_name = file_url.rsplit("/", 1)[-1][:-4].split("_")
 
         # Extracting metadata about the dataframe so it can be used to save the data and in preprocessing.
         df.attrs["date"] = split_file_name[0]
@@ -167,10 +376,10 @@ class Scraper:
 
         return df
 
-    def __to_csv_helper(self, df):
-        path = Path(f"{self.save_path}/{df.attrs['date']}/")
-        path.mkdir(parents=True, exist_ok=True)
-        file_path = f"{path.as_posix()}/{df.attrs['file_name']}.csv"
+    def __save_helper(self, df):
+        location = self.location_cache.get(df.attrs["sensor_id"], "unknown").replace("/", "-")
+
+        with self.metrics.span("write_raw"):
+            file_path = self.storage.write_raw(df, self.save_path, location)
 
-        logging.info(f"Saving dataframe to {file_path}")
-        df.to_csv(file_path, index=False)
+        logging.debug(f"Saved dataframe to {file_path}")
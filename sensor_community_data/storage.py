@@ -0,0 +1,224 @@
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sensor_community_data.cleaning import timestamp_format
+
+storage_formats = ["csv", "parquet"]
+
+# Columns that are always kept when loading scraped data since they are needed for preprocessing.
+common_columns = ["location", "lat", "lon", "timestamp"]
+
+
+# Return the storage used to read and write data in the given format.
+def create_storage(storage_format):
+    if storage_format == "csv":
+        return CsvStorage()
+    elif storage_format == "parquet":
+        return ParquetStorage()
+    else:
+        raise ValueError(f"Unknown storage format '{storage_format}', expected one of {storage_formats}")
+
+
+# Return the date, sensor id and sensor type from a file name with the format "date_sensorid_sensortype".
+def parse_file_name(file_name):
+    split_file_name = file_name.split("_")
+    return split_file_name[0], split_file_name[1], split_file_name[2]
+
+
+class CsvStorage:
+    """
+    Storage writing each dataframe to a plain CSV file. Scraped data is saved in a folder per day and preprocessed data
+    in a folder per location, or in a single file per location if the city data is combined.
+    """
+    extension = "csv"
+
+    # Writing scraped data with the timestamps in the format used in the archive.
+    def write_raw(self, df, root, location):
+        return self.write(df, Path(root, df.attrs["date"]), df.attrs["file_name"], date_format=timestamp_format)
+
+    # Writing preprocessed data. Combined city data is appended to the existing data from the location, while the
+    # files with data from a single sensor on a single day are overwritten.
+    def write_processed(self, df, root, location, combined):
+        directory = Path(root) if combined else Path(root, location)
+        return [self.write(df, directory, df.attrs["file_name"], append=combined)]
+
+    # Writing the dataframe to the file, appending to the data if the file already exists and append is true.
+    def write(self, df, directory, file_name, append=False, date_format=None):
+        directory.mkdir(parents=True, exist_ok=True)
+        file_path = directory.joinpath(f"{file_name}.{self.extension}")
+
+        if append and file_path.is_file():
+            df.to_csv(file_path, mode="a", index=False, header=False, date_format=date_format)
+        else:
+            df.to_csv(file_path, index=False, date_format=date_format)
+
+        return file_path
+
+    # Return the scraped data files in the folder, skipping files outside the given dates, locations and sensor types.
+    @staticmethod
+    def find_files(root, start_date=None, end_date=None, locations=None, sensor_types=None, location_lookup=None):
+        for data_file in sorted(Path(root).rglob("*.csv")):
+            date, sensor_id, sensor_type = parse_file_name(data_file.stem)
+
+            if not _in_date_range(date, start_date, end_date):
+                continue
+            if sensor_types and sensor_type not in sensor_types:
+                continue
+            if locations and location_lookup(sensor_id) not in locations:
+                continue
+
+            yield data_file
+
+    @staticmethod
+    def read(file_path, measurements=None):
+        if measurements:
+            wanted_columns = set(common_columns + measurements)
+            return pd.read_csv(file_path, usecols=lambda column: column in wanted_columns)
+        else:
+            return pd.read_csv(file_path)
+
+    # Return the latitude and longitude of the sensor in the file, only reading the first row.
+    @staticmethod
+    def read_coordinates(file_path):
+        df = pd.read_csv(file_path, usecols=["lat", "lon"], nrows=1)
+        return df["lat"].iloc[0], df["lon"].iloc[0]
+
+
+class ParquetStorage:
+    """
+    Storage writing each dataframe to a compressed Parquet file, partitioned into "key=value" folders by date, location
+    and sensor type so loading a subset of the data only reads the relevant folders. Measurements are stored as
+    float32 and timestamps as native timestamps. Requires the pyarrow package.
+
+    Parameters
+    ----------
+    compression : str, optional
+        The compression codec used for the Parquet files (the default is "zstd").
+    """
+    extension = "parquet"
+
+    def __init__(self, compression="zstd"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("The pyarrow package is required to use the parquet storage format")
+
+        self.compression = compression
+
+    def write_raw(self, df, root, location):
+        date, sensor_type = df.attrs["date"], df.attrs["sensor_type"]
+        directory = Path(root, f"date={date}", f"location={location}", f"sensor_type={sensor_type}")
+
+        return self.write(df, directory, df.attrs["file_name"])
+
+    # Writing preprocessed data, partitioned by location and date. Combined city data is split into a file per date and
+    # appended to the existing data, while the files with data from a single sensor on a single day are overwritten.
+    def write_processed(self, df, root, location, combined):
+        file_name = df.attrs["file_name"]
+        location_path = Path(root, f"location={location}")
+
+        if combined:
+            return [self.write(day_df, location_path.joinpath(f"date={date}"), file_name, append=True)
+                    for date, day_df in df.groupby(df["timestamp"].dt.date)]
+        else:
+            date, _, sensor_type = parse_file_name(file_name)
+            directory = location_path.joinpath(f"date={date}", f"sensor_type={sensor_type}")
+
+            return [self.write(df, directory, file_name)]
+
+    # Writing the dataframe to the file. Since Parquet files cannot be appended to, appended data is written to a new
+    # part file next to the existing file instead.
+    def write(self, df, directory, file_name, append=False):
+        directory.mkdir(parents=True, exist_ok=True)
+        file_path = directory.joinpath(f"{file_name}.{self.extension}")
+
+        part = 1
+        while append and file_path.is_file():
+            file_path = directory.joinpath(f"{file_name}.{part}.{self.extension}")
+            part += 1
+
+        self.__to_typed_dataframe(df).to_parquet(file_path, index=False, compression=self.compression)
+
+        return file_path
+
+    # Return the scraped data files in the folder. Partition folders outside the given dates, locations and sensor
+    # types are skipped without listing their content.
+    @staticmethod
+    def find_files(root, start_date=None, end_date=None, locations=None, sensor_types=None, location_lookup=None):
+        for date_path in _get_partitions(Path(root), "date"):
+            if not _in_date_range(date_path.name[5:], start_date, end_date):
+                continue
+
+            for location_path in _get_partitions(date_path, "location"):
+                if locations and location_path.name[9:] not in locations:
+                    continue
+
+                for sensor_type_path in _get_partitions(location_path, "sensor_type"):
+                    if sensor_types and sensor_type_path.name[12:] not in sensor_types:
+                        continue
+
+                    yield from sorted(sensor_type_path.glob("*.parquet"))
+
+    @staticmethod
+    def read(file_path, measurements=None):
+        if measurements:
+            return pd.read_parquet(file_path, columns=common_columns + measurements)
+        else:
+            return pd.read_parquet(file_path)
+
+    # Return the latitude and longitude of the sensor in the file, only reading the coordinate columns.
+    @staticmethod
+    def read_coordinates(file_path):
+        df = pd.read_parquet(file_path, columns=["lat", "lon"])
+        return df["lat"].iloc[0], df["lon"].iloc[0]
+
+    # Return a copy of the dataframe with compact, typed columns.
+    @staticmethod
+    def __to_typed_dataframe(df):
+        df = df.copy()
+
+        for column in df.columns:
+            if column == "timestamp":
+                df[column] = pd.to_datetime(df[column])
+            elif column not in ["location", "lat", "lon", "lockdown"] and df[column].dtype == np.float64:
+                df[column] = df[column].astype(np.float32)
+
+        return df
+
+
+# Return the date, sensor id and sensor type of a scraped data file, removing the part number if the file is an appended
+# part file.
+def parse_data_file(data_file):
+    return parse_file_name(data_file.name.split(".")[0])
+
+
+# Load a scraped data file into a dataframe, with the metadata from the file name as attributes.
+def load_dataframe(storage, data_file, measurements=None):
+    df = storage.read(data_file, measurements)
+
+    df.attrs["date"], df.attrs["sensor_id"], df.attrs["sensor_type"] = parse_data_file(data_file)
+    df.attrs["file_name"] = data_file.name.split(".")[0]
+
+    return df
+
+
+# Load the scraped data files in the folder into dataframes, with the metadata from the file names as attributes.
+def load_dataframes(storage, root, measurements=None, **filters):
+    dataframes = [load_dataframe(storage, data_file, measurements) for data_file in storage.find_files(root, **filters)]
+
+    logging.info(f"Loaded {len(dataframes)} {storage.extension} files into dataframes")
+    return dataframes
+
+
+def _get_partitions(path, key):
+    if not path.is_dir():
+        return []
+
+    return sorted(entry for entry in path.iterdir() if entry.is_dir() and entry.name.startswith(f"{key}="))
+
+
+def _in_date_range(date, start_date=None, end_date=None):
+    return (not start_date or date >= str(start_date)) and (not end_date or date <= str(end_date))